@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault('BOT_TOKEN', '123456:' + 'A' * 35)
+
+from aiohttp import web
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage, SendPhoto
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from callbacks import ARTICLE_PAGE, ARTICLE_READ, WIKI_PAGE
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+STAGES = ('analysis', 'fetch', 'format', 'split', 'send')
+
+
+class Stats:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.peaks = defaultdict(int)
+
+    def record(self, name, elapsed, peak=0):
+        self.samples[name].append(elapsed)
+        if peak > self.peaks[name]:
+            self.peaks[name] = peak
+
+
+stats = Stats()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _memory_start():
+    if not tracemalloc.is_tracing():
+        return None
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    return current
+
+
+def _memory_peak(start):
+    if start is None:
+        return 0
+    return max(0, tracemalloc.get_traced_memory()[1] - start)
+
+
+def timed(stage, func):
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            memory = _memory_start()
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                stats.record(stage, time.perf_counter() - started, _memory_peak(memory))
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        memory = _memory_start()
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.record(stage, time.perf_counter() - started, _memory_peak(memory))
+    return wrapper
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.message_id = 0
+        self.callbacks = defaultdict(list)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def make_request(self, bot, method, timeout=None):
+        memory = _memory_start()
+        started = time.perf_counter()
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if not isinstance(method, (SendMessage, SendPhoto, EditMessageText)):
+                return True
+            chat_id = int(method.chat_id)
+            markup = method.reply_markup
+            if markup is not None:
+                for row in markup.inline_keyboard:
+                    for button in row:
+                        if button.callback_data:
+                            self.callbacks[chat_id].append(button.callback_data)
+            self.message_id += 1
+            return Message(
+                message_id=self.message_id,
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type='private'),
+                text=getattr(method, 'text', None) or getattr(method, 'caption', None)
+            ).as_(bot)
+        finally:
+            stats.record('send', time.perf_counter() - started, _memory_peak(memory))
+
+
+class StubUpstream:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.wiki = (FIXTURES / 'wikipedia_python.json').read_bytes()
+        self.github = (FIXTURES / 'github_python.json').read_bytes()
+        self.stackoverflow = (FIXTURES / 'stackoverflow_python.json').read_bytes()
+        self.habr = (FIXTURES / 'habr_search_python.html').read_bytes()
+        self.runner = None
+        self.base_url = None
+
+    async def _reply(self, body, content_type):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(body=body, content_type=content_type, charset='utf-8')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/w/api.php', lambda request: self._reply(self.wiki, 'application/json'))
+        app.router.add_get('/github/search', lambda request: self._reply(self.github, 'application/json'))
+        app.router.add_get('/stackoverflow/search', lambda request: self._reply(self.stackoverflow, 'application/json'))
+        app.router.add_get('/habr/search/', lambda request: self._reply(self.habr, 'text/html'))
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def patch_bot_module(bot_module, base_url, flood_limits=False):
+    bot_module.WIKI_API_URL = base_url + '/w/api.php'
+    bot_module.GITHUB_SEARCH_URL = base_url + '/github/search'
+    bot_module.STACKOVERFLOW_SEARCH_URL = base_url + '/stackoverflow/search'
+    bot_module.HABR_SEARCH_URL = base_url + '/habr/search/'
+
+    # лимиты настоящих API в офлайн-прогоне только мешают
+    unlimited = {'rate': 1e9, 'capacity': 1e9}
+    bot_module.guards = bot_module.create_guards({name: unlimited for name in bot_module.guards})
+    if not flood_limits:
+        bot_module.sender = bot_module.SendScheduler(global_rate=1e9, chat_rate=1e9, chat_burst=10 ** 9)
+
+    bot_module.analyze_query_patterns = timed('analysis', bot_module.analyze_query_patterns)
+    for name in ('get_wiki_page', 'search_github', 'search_stackoverflow', 'search_habr'):
+        setattr(bot_module, name, timed('fetch', getattr(bot_module, name)))
+    bot_module.format_wiki_chunk = timed('format', bot_module.format_wiki_chunk)
+    bot_module.split_offsets = timed('split', bot_module.split_offsets)
+
+
+class Driver:
+    def __init__(self, bot_module, bot, dp, session):
+        self.bot_module = bot_module
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.update_id = 0
+
+    def _next_id(self):
+        self.update_id += 1
+        return self.update_id
+
+    def _user(self, user_id):
+        return User(id=user_id, is_bot=False, first_name='Bench')
+
+    async def send_text(self, user_id, text):
+        update_id = self._next_id()
+        update = Update(update_id=update_id, message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type='private'),
+            from_user=self._user(user_id),
+            text=text
+        ))
+        await self._feed('handle_text', update)
+
+    async def press(self, user_id, data, handler):
+        update_id = self._next_id()
+        update = Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id),
+            from_user=self._user(user_id),
+            chat_instance='bench',
+            data=data,
+            message=Message(
+                message_id=update_id,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type='private'),
+                text='bench'
+            )
+        ))
+        await self._feed(handler, update)
+
+    async def _feed(self, handler, update):
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        stats.record(f'handler:{handler}', time.perf_counter() - started)
+
+    def find_callback(self, user_id, kind):
+        for data in reversed(self.session.callbacks[user_id]):
+            payload = self.bot_module.callbacks.decode(data)
+            if payload is not None and payload.kind == kind:
+                return data, payload
+        return None, None
+
+    async def user_scenario(self, user_id, query):
+        callbacks = self.bot_module.callbacks
+        await self.send_text(user_id, query)
+
+        next_data, _ = self.find_callback(user_id, WIKI_PAGE)
+        if next_data:
+            await self.press(user_id, next_data, 'handle_navigation')
+
+        read_data, payload = self.find_callback(user_id, ARTICLE_READ)
+        if read_data:
+            await self.press(user_id, read_data, 'handle_read_article')
+            await self.press(user_id, callbacks.encode(ARTICLE_PAGE, payload.key, 1), 'handle_article_navigation')
+
+
+async def run_rounds(driver, users, rounds, cached, tag='run'):
+    started = time.perf_counter()
+    for round_index in range(rounds):
+        await asyncio.gather(*[
+            driver.user_scenario(
+                user_id,
+                "что такое python" if cached else f"что такое python {tag}-{round_index}-{user_id}"
+            )
+            for user_id in range(1, users + 1)
+        ])
+    return time.perf_counter() - started
+
+
+def report(title, elapsed, updates):
+    print(f"\n== {title} ==")
+    print(f"{updates} updates in {elapsed:.2f}s -> {updates / elapsed:,.1f} updates/s")
+    print(f"{'stage':<36}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KB':>10}")
+    names = [stage for stage in STAGES if stage in stats.samples]
+    names += sorted(name for name in stats.samples if name.startswith('handler:'))
+    for name in names:
+        values = stats.samples[name]
+        print(
+            f"{name:<36}{len(values):>8}"
+            f"{percentile(values, 0.5) * 1000:>10.2f}"
+            f"{percentile(values, 0.95) * 1000:>10.2f}"
+            f"{percentile(values, 0.99) * 1000:>10.2f}"
+            + (f"{stats.peaks[name] / 1024:>10.0f}" if name in STAGES else f"{'-':>10}")
+        )
+
+
+async def main(args):
+    upstream = StubUpstream(args.upstream_latency / 1000)
+    await upstream.start()
+
+    import main as bot_module
+
+    logging.getLogger('aiogram.event').setLevel(logging.WARNING)
+    patch_bot_module(bot_module, upstream.base_url, args.flood_limits)
+    session = FakeSession(args.telegram_latency / 1000)
+    bot, dp = bot_module.create_app(session=session)
+    driver = Driver(bot_module, bot, dp, session)
+
+    await bot_module.on_startup()
+    try:
+        # отдельный последовательный прогон с tracemalloc: пики памяти по стадиям
+        tracemalloc.start()
+        await run_rounds(driver, 1, 3, cached=False, tag='memory')
+        tracemalloc.stop()
+        peaks = dict(stats.peaks)
+        bot_module.cache.memory.clear()
+        bot_module.chunk_cache.clear()
+
+        stats.samples.clear()
+        stats.peaks.clear()
+        updates_before = driver.update_id
+        elapsed = await run_rounds(driver, args.users, args.rounds, cached=args.cached)
+        stats.peaks.update(peaks)
+        report(
+            f"{args.users} users x {args.rounds} rounds ({'cached' if args.cached else 'cold'} queries)",
+            elapsed,
+            driver.update_id - updates_before
+        )
+    finally:
+        await bot_module.on_shutdown()
+        await upstream.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline benchmark of the bot handlers against synthetic upstream responses (see make_fixtures.py)")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--cached', action='store_true', help="repeat one query so lookups hit the result cache")
+    parser.add_argument('--upstream-latency', type=float, default=0, help="simulated upstream latency, ms")
+    parser.add_argument('--flood-limits', action='store_true', help="keep Telegram send limits of the scheduler")
+    parser.add_argument('--telegram-latency', type=float, default=0, help="simulated Telegram API latency, ms")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from habr import HABR_PARSERS, parse_habr_results
+from text_utils import escape_markdown
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+def legacy_parse_habr_results(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    results = []
+
+    articles = soup.find_all('article', class_='tm-articles-list__item')[:3]
+    for article in articles:
+        title_elem = article.find('h2')
+        if title_elem:
+            title_link = title_elem.find('a')
+            if title_link:
+                title = escape_markdown(title_link.text.strip())
+                link = "https://habr.com" + title_link['href']
+
+                description_elem = article.find(['div', 'p'], class_=re.compile('article-formatted-body'))
+                description = ""
+                if description_elem:
+                    description = escape_markdown(description_elem.text.strip()[:200] + "...")
+                else:
+                    description = "Читать на Habr"
+
+                content = f"**{title}**\n\n{description}\n\n🔗 [Читать на Habr]({link})"
+
+                results.append({
+                    'title': title,
+                    'description': description,
+                    'url': link,
+                    'source': 'Habr',
+                    'content': content
+                })
+
+    return results
+
+
+def measure(parse, html, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        parse(html)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def main(rounds=20):
+    for fixture in sorted(FIXTURES.glob('habr_*.html')):
+        html = fixture.read_text(encoding='utf-8')
+        expected = legacy_parse_habr_results(html)
+        print(f"{fixture.name} ({len(html) // 1024} KB, {len(expected)} results)")
+
+        legacy = measure(legacy_parse_habr_results, html, rounds)
+        print(f"  legacy bs4 full page: {legacy:8.2f} ms")
+
+        for name in HABR_PARSERS:
+            if parse_habr_results(html, name) != expected:
+                raise SystemExit(f"{name} results differ from legacy parser on {fixture.name}")
+            elapsed = measure(lambda page: parse_habr_results(page, name), html, rounds)
+            print(f"  {name:<10} partial:     {elapsed:8.2f} ms  ({legacy / elapsed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
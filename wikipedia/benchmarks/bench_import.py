@@ -0,0 +1,77 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# что замеряется в свежем интерпретаторе: импорт модуля и сборка приложения
+SNIPPETS = {
+    'import main': "import main",
+    'create_app': "import main; main.create_app('123456:' + 'A' * 35)",
+}
+# тяжелые зависимости, которые не должны грузиться при импорте
+LAZY_MODULES = ('lxml', 'selectolax', 'bs4')
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def run_python(code, *flags):
+    env = dict(os.environ)
+    env.pop('BOT_TOKEN', None)
+    return subprocess.run(
+        [sys.executable, *flags, '-c', code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def measure(code, runs):
+    timer = (
+        "import time; started = time.perf_counter(); {code}; "
+        "print(time.perf_counter() - started)"
+    )
+    return [float(run_python(timer.format(code=code)).stdout.split()[-1]) for _ in range(runs)]
+
+
+def slowest_imports(code, top):
+    modules = []
+    for line in run_python(code, '-X', 'importtime').stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        # только то, что импортирует сам main: вложенные импорты уже учтены в них
+        if match and len(match.group(3)) == 3:
+            modules.append((int(match.group(2)), match.group(4)))
+    return sorted(modules, reverse=True)[:top]
+
+
+def loaded_lazy_modules(code):
+    check = f"{code}; import sys; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    return run_python(check).stdout.split()
+
+
+def main(args):
+    print(f"{'stage':<16}{'runs':>6}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, code in SNIPPETS.items():
+        values = measure(code, args.runs)
+        print(
+            f"{name:<16}{len(values):>6}{statistics.median(values) * 1000:>12.1f}"
+            f"{min(values) * 1000:>10.1f}{max(values) * 1000:>10.1f}"
+        )
+
+    print("\nslowest imports made by main:")
+    for cumulative, module in slowest_imports(SNIPPETS['import main'], args.top):
+        print(f"  {cumulative / 1000:>10.1f} ms  {module}")
+
+    loaded = loaded_lazy_modules(SNIPPETS['create_app'])
+    if loaded:
+        raise SystemExit(f"Loaded eagerly: {', '.join(loaded)}")
+    print(f"\nnot loaded until first use: {', '.join(LAZY_MODULES)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cold import and application start time in a fresh interpreter")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    main(parser.parse_args())
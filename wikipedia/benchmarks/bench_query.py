@@ -0,0 +1,82 @@
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from query_analyzer import QUERY_KEYWORDS, QUERY_PATTERNS, analyze_query_patterns
+
+SAMPLE_QUERIES = [
+    "что такое искусственный интеллект",
+    "как создать телеграм бот на Python",
+    "пример кода для парсинга сайта",
+    "разница между list и tuple в Python",
+    "история языка Rust",
+    "почему asyncio быстрее потоков?",
+    "что значит GIL? как его обойти?",
+    "Python",
+    "машинное обучение",
+    "способ ускорить pandas и примеры кода",
+]
+
+
+def legacy_analyze_query_patterns(query):
+    patterns_found = []
+
+    for pattern_type, pattern_regex in QUERY_PATTERNS.items():
+        matches = re.findall(pattern_regex, query.lower())
+        if matches:
+            for match in matches:
+                if len(match) == 2:
+                    patterns_found.append({
+                        'type': pattern_type,
+                        'keyword': match[0],
+                        'subject': match[1].strip()
+                    })
+
+    if not patterns_found:
+        patterns_found.append({
+            'type': 'general',
+            'subject': query.strip()
+        })
+
+    return patterns_found
+
+
+def random_queries(count, seed=1):
+    rng = random.Random(seed)
+    words = [keyword for keywords in QUERY_KEYWORDS.values() for keyword in keywords]
+    words += ['python', 'бот', 'код?', '?', 'rust', 'какой', ' ', 'данные', 'Что', 'ПРИМЕР']
+    return [
+        ' '.join(rng.choice(words) for _ in range(rng.randint(1, 8)))
+        for _ in range(count)
+    ]
+
+
+def measure(analyze, queries, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            analyze(query)
+    elapsed = time.perf_counter() - started
+    return rounds * len(queries) / elapsed
+
+
+def main(rounds=2000):
+    for query in SAMPLE_QUERIES + random_queries(5000):
+        expected = legacy_analyze_query_patterns(query)
+        actual = analyze_query_patterns(query)
+        if expected != actual:
+            raise SystemExit(f"Mismatch for {query!r}: {expected} != {actual}")
+
+    legacy = measure(legacy_analyze_query_patterns, SAMPLE_QUERIES, rounds)
+    current = measure(analyze_query_patterns, SAMPLE_QUERIES, rounds)
+    print(f"legacy:  {legacy:12,.0f} msg/s")
+    print(f"current: {current:12,.0f} msg/s")
+    print(f"speedup: {current / legacy:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
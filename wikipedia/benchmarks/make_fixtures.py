@@ -0,0 +1,136 @@
+"""Генератор синтетических ответов Wikipedia, GitHub и StackExchange для bench_bot.py.
+
+Это не записи настоящих ответов: из окружения сборки API недоступны. Файлы
+повторяют форму ответов и объемы, важные для бота (длинный extract с
+разделами, по три-пять результатов с описаниями), а текст составлен из
+случайных слов. Генератор детерминирован: повторный запуск дает те же файлы.
+"""
+import json
+import random
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+SEED = 14
+
+WORDS = (
+    'python', 'интерпретатор', 'модуль', 'пакет', 'функция', 'класс', 'объект', 'итератор', 'генератор',
+    'декоратор', 'исключение', 'синтаксис', 'типизация', 'динамическая', 'стандартная', 'библиотека',
+    'сборка', 'мусора', 'подсчет', 'ссылок', 'байт-код', 'cpython', 'pypy', 'jython', 'поток',
+    'асинхронность', 'сообщество', 'версия', 'году', 'был', 'создан', 'является', 'использовать',
+    'широко', 'применяется', 'позволяет', 'реализация', 'отступы', 'программирования', 'разработчиков',
+    'и', 'в', 'на', 'с', 'из', 'по', 'что', 'это', 'также', 'как'
+)
+
+WIKI_SECTIONS = (
+    'История', 'Философия', 'Синтаксис и семантика', 'Типизация', 'Стандартная библиотека',
+    'Реализации', 'Производительность', 'Сравнение с другими языками', 'Применение', 'Критика'
+)
+
+
+def sentence(rng, low=8, high=20):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def paragraph(rng, sentences=5):
+    return ' '.join(sentence(rng) for _ in range(rng.randint(sentences - 2, sentences + 2)))
+
+
+def wiki_extract(rng):
+    # формат explaintext с exsectionformat=wiki: заголовки разделов в виде "== ... =="
+    blocks = [paragraph(rng) for _ in range(3)]
+    for section in WIKI_SECTIONS:
+        blocks.append(f"== {section} ==")
+        blocks.extend(paragraph(rng) for _ in range(rng.randint(2, 4)))
+        for number in range(1, rng.randint(2, 4)):
+            blocks.append(f"=== {section}: раздел {number} ===")
+            blocks.extend(paragraph(rng) for _ in range(rng.randint(3, 5)))
+    return '\n\n'.join(blocks)
+
+
+def wikipedia(rng):
+    return {
+        'batchcomplete': True,
+        'query': {
+            'normalized': [{'fromencoded': False, 'from': 'python', 'to': 'Python'}],
+            'pages': [{
+                'pageid': 101,
+                'ns': 0,
+                'title': 'Python',
+                'extract': wiki_extract(rng),
+                'fullurl': 'https://ru.wikipedia.org/wiki/Python',
+                'canonicalurl': 'https://ru.wikipedia.org/wiki/Python',
+                'thumbnail': {
+                    'source': 'https://upload.wikimedia.org/wikipedia/commons/thumb/c/c3/'
+                              'Python-logo-notext.svg/640px-Python-logo-notext.svg.png',
+                    'width': 640,
+                    'height': 640
+                },
+                'pageimage': 'Python-logo-notext.svg'
+            }]
+        }
+    }
+
+
+def github(rng):
+    repositories = (
+        ('python', 'cpython', None), ('TheAlgorithms', 'Python', 'Python'), ('django', 'django', 'Python'),
+        ('pallets', 'flask', 'Python'), ('psf', 'requests', 'Python')
+    )
+    items = []
+    for number, (owner, name, language) in enumerate(repositories):
+        stars = 200000 // (number + 1)
+        items.append({
+            'id': 1000 + number,
+            'name': name,
+            'full_name': f"{owner}/{name}",
+            'owner': {'login': owner, 'type': 'Organization', 'html_url': f"https://github.com/{owner}"},
+            'html_url': f"https://github.com/{owner}/{name}",
+            'description': ' '.join(sentence(rng) for _ in range(rng.randint(2, 3))),
+            'stargazers_count': stars,
+            'watchers_count': stars,
+            'forks_count': stars // 7,
+            'language': language,
+            'topics': ['python'],
+            'score': 1.0
+        })
+    return {'total_count': 4123456, 'incomplete_results': False, 'items': items}
+
+
+def stackoverflow(rng):
+    titles = (
+        "What is the difference between lists and tuples in Python?",
+        "How do I make a flat list out of a list of lists?",
+        "Why is a tuple faster to create than a list?"
+    )
+    tag_sets = (
+        ['python', 'list', 'tuples'], ['python', 'list', 'multidimensional-array', 'flatten'],
+        ['python', 'performance', 'tuples', 'cpython']
+    )
+    items = []
+    for number, (title, tags) in enumerate(zip(titles, tag_sets)):
+        question_id = rng.randint(1_000_000, 70_000_000)
+        items.append({
+            'tags': tags,
+            'owner': {'user_id': rng.randint(1000, 9_000_000), 'user_type': 'registered'},
+            'is_answered': True,
+            'view_count': rng.randint(50_000, 900_000),
+            'answer_count': rng.randint(5, 40),
+            'score': rng.randint(300, 4000),
+            'question_id': question_id,
+            'link': f"https://stackoverflow.com/questions/{question_id}/question-{number}",
+            'title': title
+        })
+    return {'items': items, 'has_more': True, 'quota_max': 300, 'quota_remaining': 287}
+
+
+def main():
+    rng = random.Random(SEED)
+    for name, build in (('wikipedia', wikipedia), ('github', github), ('stackoverflow', stackoverflow)):
+        path = FIXTURES / f"{name}_python.json"
+        path.write_text(json.dumps(build(rng), ensure_ascii=False), encoding='utf-8')
+        print(f"{path.name}: {path.stat().st_size // 1024} KB")
+
+
+if __name__ == '__main__':
+    main()
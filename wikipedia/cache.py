@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH')
+
+SOURCE_TTLS = {
+    'wikipedia': 24 * 3600,
+    'github': 3600,
+    'stackoverflow': 3600,
+    'habr': 1800
+}
+# страницы Wikipedia по pageid (кнопки навигации, локальный индекс) живут столько же, сколько по названию
+SOURCE_TTLS['wikipage'] = SOURCE_TTLS['wikipedia']
+DEFAULT_TTL = 600
+
+MISSING = object()
+
+_whitespace_re = re.compile(r'\s+')
+
+
+def normalize_subject(subject):
+    return _whitespace_re.sub(' ', subject.lower()).strip(' \t\n?!.,;:"\'«»')
+
+
+class LRUCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return MISSING
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def ttl_left(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return 0
+        return max(0, item[0] - time.monotonic())
+
+    def clear(self):
+        self._data.clear()
+
+
+class SQLiteCache:
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5)
+        # WAL: базу кеша могут одновременно использовать несколько воркеров
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.purge()
+
+    def get(self, key):
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return MISSING, 0
+        value, expires_at = row
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return MISSING, 0
+        return json.loads(value), ttl
+
+    def set(self, key, value, ttl):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+        )
+        self._conn.commit()
+
+    def purge(self):
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight = {}
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    async def do(self, key, fetch):
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.coalesced += 1
+        else:
+            # [задача, число ожидающих]
+            entry = self._inflight[key] = [asyncio.ensure_future(fetch()), 0]
+            entry[0].add_done_callback(lambda _: self._inflight.pop(key, None))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: отмена одного ожидающего не должна отменять общий запрос
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # ...но если отменились все, запрос к источнику больше никому не нужен
+            if entry[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+
+class ResultCache:
+    def __init__(self, ttls=None, max_entries=CACHE_MAX_ENTRIES, db_path=CACHE_DB_PATH):
+        self.ttls = dict(SOURCE_TTLS if ttls is None else ttls)
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteCache(db_path) if db_path else None
+        self.flight = SingleFlight()
+        self.hits = {}
+        self.misses = {}
+        self.coalesced = {}
+
+    @staticmethod
+    def make_key(source, subject):
+        return f"{source}:{normalize_subject(subject)}"
+
+    def ttl_for(self, source):
+        return self.ttls.get(source, DEFAULT_TTL)
+
+    def peek(self, source, subject):
+        # как get, но без учета в статистике попаданий: для подсказок и прогрева
+        key = self.make_key(source, subject)
+        value = self.memory.get(key)
+        if value is MISSING and self.disk is not None:
+            value, ttl = self.disk.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value, ttl)
+        return value
+
+    def get(self, source, subject):
+        value = self.peek(source, subject)
+        if value is MISSING:
+            self.misses[source] = self.misses.get(source, 0) + 1
+        else:
+            self.hits[source] = self.hits.get(source, 0) + 1
+        return value
+
+    def set(self, source, subject, value):
+        key = self.make_key(source, subject)
+        ttl = self.ttl_for(source)
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl)
+            except Exception as e:
+                logger.error(f"Error writing cache entry {key}: {e}")
+
+    async def _fetch_and_store(self, source, subject, fetch):
+        result = await fetch(subject)
+        # пустые ответы не кешируем: источники возвращают их и при ошибках
+        if result:
+            self.set(source, subject, result)
+        return result
+
+    async def cached(self, source, subject, fetch):
+        value = self.get(source, subject)
+        if value is not MISSING:
+            return value
+
+        key = self.make_key(source, subject)
+        if key in self.flight:
+            self.coalesced[source] = self.coalesced.get(source, 0) + 1
+        return await self.flight.do(key, lambda: self._fetch_and_store(source, subject, fetch))
+
+    def ttl_left(self, source, subject):
+        return self.memory.ttl_left(self.make_key(source, subject))
+
+    async def refresh(self, source, subject, fetch):
+        # принудительное обновление записи в фоне, мимо уже закешированного значения
+        return await self.flight.do(
+            self.make_key(source, subject), lambda: self._fetch_and_store(source, subject, fetch)
+        )
+
+    def stats(self):
+        sources = sorted(set(self.hits) | set(self.misses))
+        return {
+            'entries': len(self.memory),
+            'evictions': self.memory.evictions,
+            'coalesced': self.flight.coalesced,
+            'sources': {
+                source: {
+                    'hits': self.hits.get(source, 0),
+                    'misses': self.misses.get(source, 0),
+                    'coalesced': self.coalesced.get(source, 0)
+                }
+                for source in sources
+            }
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
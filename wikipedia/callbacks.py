@@ -0,0 +1,87 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+# Кнопки несут все, что нужно для перерисовки страницы: вид действия, номер
+# страницы и ключ содержимого в общем кеше. Данные подписаны, поэтому
+# подделать ключ или номер нельзя, а хранить что-то на пользователя не нужно.
+CALLBACK_SECRET = os.getenv('CALLBACK_SECRET')
+CALLBACK_PREFIX = '~'
+MAX_CALLBACK_DATA = 64
+SIGNATURE_SIZE = 8
+
+WIKI_PAGE = 1
+ARTICLE_READ = 2
+ARTICLE_PAGE = 3
+
+HEADER = struct.Struct('>BH')
+PAGEID = struct.Struct('>I')
+
+
+class CallbackPayload:
+    __slots__ = ('kind', 'index', 'key')
+
+    def __init__(self, kind, index, key):
+        self.kind = kind
+        self.index = index
+        self.key = key
+
+    @property
+    def pageid(self):
+        return PAGEID.unpack(self.key)[0]
+
+
+class CallbackCodec:
+    def __init__(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self._secret = hashlib.sha256(b'callback_data:' + secret).digest()
+
+    def _sign(self, body):
+        return hmac.new(self._secret, body, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+    def encode(self, kind, key, index=0):
+        body = HEADER.pack(kind, index) + key
+        data = CALLBACK_PREFIX + base64.urlsafe_b64encode(body + self._sign(body)).rstrip(b'=').decode()
+        if len(data) > MAX_CALLBACK_DATA:
+            raise ValueError(f"callback_data is {len(data)} bytes, Telegram allows {MAX_CALLBACK_DATA}")
+        return data
+
+    def encode_wiki_page(self, pageid, index):
+        return self.encode(WIKI_PAGE, PAGEID.pack(pageid), index)
+
+    def decode(self, data):
+        if not data or not data.startswith(CALLBACK_PREFIX):
+            return None
+        encoded = data[len(CALLBACK_PREFIX):]
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) < HEADER.size + SIGNATURE_SIZE:
+            return None
+        body, signature = raw[:-SIGNATURE_SIZE], raw[-SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(body)):
+            return None
+        kind, index = HEADER.unpack_from(body)
+        return CallbackPayload(kind, index, body[HEADER.size:])
+
+
+class CallbackKind(Filter):
+    """Пропускает кнопки нужного вида и передает обработчику разобранный payload."""
+
+    def __init__(self, codec, kind):
+        self.codec = codec
+        self.kind = kind
+
+    async def __call__(self, callback: CallbackQuery):
+        payload = self.codec.decode(callback.data)
+        if payload is None or payload.kind != self.kind:
+            return False
+        return {'payload': payload}
@@ -0,0 +1,137 @@
+import os
+import re
+
+from text_utils import escape_markdown
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+HABR_URL = "https://habr.com"
+HABR_MAX_RESULTS = 3
+
+ARTICLE_CLASS = 'tm-articles-list__item'
+DESCRIPTION_CLASS = 'article-formatted-body'
+DESCRIPTION_CLASS_RE = re.compile(DESCRIPTION_CLASS)
+
+# Начало карточки статьи в сыром HTML: по нему вырезается кусок страницы
+# с первыми HABR_MAX_RESULTS статьями, остальное парсеру не отдается.
+ARTICLE_START_RE = re.compile(
+    r'<article\b[^>]*\bclass=["\'][^"\']*(?<![\w-])' + re.escape(ARTICLE_CLASS) + r'(?![\w-])'
+)
+
+if lxml_html is not None:
+    LXML_ARTICLES = etree.XPath(
+        f'//article[contains(concat(" ", normalize-space(@class), " "), " {ARTICLE_CLASS} ")]'
+    )
+    LXML_TITLE = etree.XPath('(.//h2)[1]')
+    LXML_LINK = etree.XPath('(.//a)[1]')
+    LXML_DESCRIPTION = etree.XPath(
+        f'(.//*[self::div or self::p][contains(@class, "{DESCRIPTION_CLASS}")])[1]'
+    )
+
+SELECTOLAX_DESCRIPTION = f'div[class*="{DESCRIPTION_CLASS}"], p[class*="{DESCRIPTION_CLASS}"]'
+
+
+def extract_articles_html(html, limit=HABR_MAX_RESULTS):
+    starts = []
+    for match in ARTICLE_START_RE.finditer(html):
+        starts.append(match.start())
+        if len(starts) > limit:
+            break
+    if not starts:
+        return html
+    if len(starts) > limit:
+        return html[starts[0]:starts[limit]]
+    return html[starts[0]:]
+
+
+def _iter_selectolax(fragment):
+    tree = HTMLParser(fragment)
+    for article in tree.css(f'article.{ARTICLE_CLASS}')[:HABR_MAX_RESULTS]:
+        title_elem = article.css_first('h2')
+        title_link = title_elem.css_first('a') if title_elem is not None else None
+        if title_link is None:
+            continue
+        description_elem = article.css_first(SELECTOLAX_DESCRIPTION)
+        yield (
+            title_link.text(),
+            title_link.attributes.get('href') or '',
+            description_elem.text() if description_elem is not None else None
+        )
+
+
+def _iter_lxml(fragment):
+    root = lxml_html.fromstring(f'<div>{fragment}</div>')
+    for article in LXML_ARTICLES(root)[:HABR_MAX_RESULTS]:
+        title_elem = LXML_TITLE(article)
+        title_link = LXML_LINK(title_elem[0]) if title_elem else None
+        if not title_link:
+            continue
+        description_elem = LXML_DESCRIPTION(article)
+        yield (
+            title_link[0].text_content(),
+            title_link[0].get('href') or '',
+            description_elem[0].text_content() if description_elem else None
+        )
+
+
+def _iter_bs4(fragment):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(fragment, 'html.parser')
+    for article in soup.find_all('article', class_=ARTICLE_CLASS)[:HABR_MAX_RESULTS]:
+        title_elem = article.find('h2')
+        title_link = title_elem.find('a') if title_elem else None
+        if not title_link:
+            continue
+        description_elem = article.find(['div', 'p'], class_=DESCRIPTION_CLASS_RE)
+        yield (
+            title_link.text,
+            title_link.get('href', ''),
+            description_elem.text if description_elem else None
+        )
+
+
+HABR_PARSERS = {'bs4': _iter_bs4}
+if lxml_html is not None:
+    HABR_PARSERS['lxml'] = _iter_lxml
+if HTMLParser is not None:
+    HABR_PARSERS['selectolax'] = _iter_selectolax
+
+HABR_PARSER = os.getenv('HABR_PARSER') or next(
+    name for name in ('selectolax', 'lxml', 'bs4') if name in HABR_PARSERS
+)
+
+
+def parse_habr_results(html, parser=None):
+    iter_articles = HABR_PARSERS[parser or HABR_PARSER]
+    results = []
+
+    for title_text, href, description_text in iter_articles(extract_articles_html(html)):
+        title = escape_markdown(title_text.strip())
+        link = HABR_URL + href
+
+        if description_text is not None:
+            description = escape_markdown(description_text.strip()[:200] + "...")
+        else:
+            description = "Читать на Habr"
+
+        content = f"**{title}**\n\n{description}\n\n🔗 [Читать на Habr]({link})"
+
+        results.append({
+            'title': title,
+            'description': description,
+            'url': link,
+            'source': 'Habr',
+            'content': content
+        })
+
+    return results
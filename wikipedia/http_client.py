@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import os
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'WikipediaTelegramBot/1.0'
+
+HTTP_LIMIT = int(os.getenv('HTTP_LIMIT', 100))
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', 10))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', 15))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+
+
+class HttpClient:
+    def __init__(
+        self,
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl=HTTP_DNS_CACHE_TTL,
+        total_timeout=HTTP_TOTAL_TIMEOUT,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self._session = None
+
+    async def start(self):
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers={'User-Agent': USER_AGENT}
+        )
+        logger.info(
+            f"HTTP client started (limit={self.limit}, per_host={self.limit_per_host})"
+        )
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTP client is not started")
+        return self._session
+
+    async def close(self):
+        if self._session is None or self._session.closed:
+            return
+        await self._session.close()
+        # даем SSL-соединениям корректно закрыться
+        await asyncio.sleep(0.25)
+        self._session = None
+        logger.info("HTTP client closed")
@@ -1,273 +1,396 @@
-import wikipediaapi
 import logging
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.types import Message, CallbackQuery
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    Message, CallbackQuery, InlineKeyboardButton, InlineQuery, InlineQueryResultArticle,
+    InputTextMessageContent
+)
 from aiogram.filters import Command
 from aiogram.enums import ParseMode
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 import asyncio
-import requests
-import re
-import aiohttp
-from bs4 import BeautifulSoup
-import json
-import uuid
+import functools
+import hashlib
+import os
+
+from cache import MISSING, LRUCache, ResultCache
+from callbacks import ARTICLE_PAGE, ARTICLE_READ, CALLBACK_SECRET, WIKI_PAGE, CallbackCodec, CallbackKind
+from http_client import HttpClient
+from metrics import (
+    CACHE_ENTRIES, CACHE_HIT_RATIO, CACHE_REQUESTS, FORMAT_SECONDS, PREFETCH_QUEUE, SEND_QUEUE, SOURCE_FETCH_SECONDS,
+    SEARCHES_RUNNING, SOURCE_RESULTS, SPLIT_SECONDS, STORE_ENTRIES, TELEGRAM_RETRIES, UPDATES_IN_FLIGHT, timer
+)
+from middlewares import ConcurrencyLimitMiddleware, TelegramMetricsMiddleware, UpdateTimingMiddleware
+from prefetch import PREFETCH_RESERVE, Prefetcher, TrendingSubjects
+from providers import Provider, ProviderRegistry
+from query_analyzer import analyze_query_patterns
+from ratelimit import SourceUnavailable, create_guards
+from sender import PRIORITY_RESULTS, PRIORITY_STATUS, SEND_GLOBAL_RATE, SendScheduler
+from search_index import LocalIndex
+from searches import SearchTracker
+from server import METRICS_PORT, run_webhook, start_metrics_server
+from storage import (
+    ARTICLE_MAX_ENTRIES, ARTICLE_TTL, STORE_BACKEND, Article, create_store
+)
+from suggestions import SuggestionIndex
+from text_utils import escape_markdown, unescape_markdown
+from wiki_text import format_wiki_chunk, split_offsets
+from workers import BOT_WORKERS, run_cpu, run_processes, shutdown_cpu_pool, start_cpu_pool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-BOT_TOKEN = "токен"
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 100))
+# лимиты Telegram и квоты источников общие на бота: в режиме webhook с
+# несколькими процессами каждый получает свою долю (лимит на чат не делится)
+WORKER_SHARE = BOT_WORKERS if BOT_MODE == 'webhook' else 1
+# фоновая подкачка ждет, пока занято меньше половины слотов обработки
+PREFETCH_BUSY_THRESHOLD = max(1, MAX_CONCURRENT_UPDATES // 2)
+TRENDING_REFRESH_INTERVAL = int(os.getenv('TRENDING_REFRESH_INTERVAL', 600))
+TRENDING_TOP = int(os.getenv('TRENDING_TOP', 10))
+CHUNK_CACHE_MAX_ENTRIES = int(os.getenv('CHUNK_CACHE_MAX_ENTRIES', 2000))
+# сколько при остановке ждать уже принятые апдейты, прежде чем закрывать отправку и хранилища
+SHUTDOWN_UPDATES_TIMEOUT = float(os.getenv('SHUTDOWN_UPDATES_TIMEOUT', 20))
+# апдейты дольше порога (в секундах) пишутся в лог с разбивкой по стадиям; 0 - выключено
+SLOW_UPDATE_THRESHOLD = float(os.getenv('SLOW_UPDATE_THRESHOLD', 0))
 
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+# при импорте ничего не открывается и не подключается: бот и диспетчер
+# собирает create_app(), хранилища открываются в on_startup()
+concurrency_limit = ConcurrencyLimitMiddleware(MAX_CONCURRENT_UPDATES)
+http = HttpClient()
+cache = None
+guards = create_guards(share=WORKER_SHARE)
+sender = SendScheduler(global_rate=SEND_GLOBAL_RATE / WORKER_SHARE)
+suggestions = SuggestionIndex()
+local_index = None
+searches = SearchTracker()
+background_tasks = set()
+prefetcher = Prefetcher(is_busy=lambda: concurrency_limit.in_flight >= PREFETCH_BUSY_THRESHOLD)
+trending = TrendingSubjects()
+chunk_cache = LRUCache(CHUNK_CACHE_MAX_ENTRIES)
+metrics_runner = None
 
-wiki_wiki = wikipediaapi.Wikipedia(
-    user_agent='WikipediaTelegramBot/1.0',
-    language='ru',
-    extract_format=wikipediaapi.ExtractFormat.WIKI
-)
+WIKI_API_URL = "https://ru.wikipedia.org/w/api.php"
+GITHUB_SEARCH_URL = "https://api.github.com/search/repositories"
+STACKOVERFLOW_SEARCH_URL = "https://api.stackexchange.com/2.3/search/advanced"
+HABR_SEARCH_URL = "https://habr.com/ru/search/"
+WIKI_THUMB_SIZE = 640
+WIKI_CHUNK_SIZE = 3000
+WIKI_RELATED_LIMIT = 3
+ARTICLE_CHUNK_SIZE = 3000
+
+# статьи лежат под ключом от URL и общие для всех пользователей
+articles = None
+# подпись кнопок одна на все воркеры: по умолчанию выводится из токена бота
+callbacks = None
+# источники поиска, собираются в create_app()
+providers = None
 
-user_sessions = {}
-user_articles = {}
+SOURCE_TIMEOUT = object()
 
-QUERY_PATTERNS = {
-    'definition': r'(что такое|определение|что значит)\s+([^?]+)',
-    'how_to': r'(как|как сделать|способ|метод)\s+([^?]+)',
-    'why': r'(почему|зачем|для чего)\s+([^?]+)',
-    'compare': r'(сравнение|разница между|отличие)\s+([^?]+)',
-    'history': r'(история|происхождение|возникновение)\s+([^?]+)',
-    'examples': r'(примеры|пример|код)\s+([^?]+)'
+# inline-режим: Telegram ждет ответа около секунды
+INLINE_MAX_SUBJECTS = 5
+INLINE_MAX_RESULTS = 20
+INLINE_FALLBACK_DEADLINE = float(os.getenv('INLINE_FALLBACK_DEADLINE', 0.8))
+INLINE_CACHE_TIME = 300
+INLINE_EMPTY_CACHE_TIME = 5
+
+SEARCH_STATUS_ICONS = {
+    'pending': '⏳',
+    'found': '✅',
+    'empty': '➖',
+    'late': '⌛'
 }
 
-def escape_markdown(text):
-    if not text:
-        return ""
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
-
-def analyze_query_patterns(query):
-    patterns_found = []
-    
-    for pattern_type, pattern_regex in QUERY_PATTERNS.items():
-        matches = re.findall(pattern_regex, query.lower())
-        if matches:
-            for match in matches:
-                if len(match) == 2:
-                    patterns_found.append({
-                        'type': pattern_type,
-                        'keyword': match[0],
-                        'subject': match[1].strip()
-                    })
-
-    if not patterns_found:
-        patterns_found.append({
-            'type': 'general',
-            'subject': query.strip()
-        })
+def collect_cache_requests():
+    values = {}
+    for source, counts in cache.stats()['sources'].items():
+        for result in ('hits', 'misses', 'coalesced'):
+            values[(source, result)] = counts[result]
+    return values
+
+def collect_cache_hit_ratio():
+    ratios = {}
+    for source, counts in cache.stats()['sources'].items():
+        total = counts['hits'] + counts['misses']
+        ratios[(source,)] = counts['hits'] / total if total else 0.0
+    return ratios
+
+CACHE_REQUESTS.set_function(collect_cache_requests)
+CACHE_HIT_RATIO.set_function(collect_cache_hit_ratio)
+CACHE_ENTRIES.set_function(lambda: len(cache.memory))
+UPDATES_IN_FLIGHT.set_function(lambda: concurrency_limit.in_flight)
+SEND_QUEUE.set_function(lambda: sender.pending)
+PREFETCH_QUEUE.set_function(lambda: prefetcher.pending)
+SEARCHES_RUNNING.set_function(lambda: searches.running)
+STORE_ENTRIES.set_function(lambda: {('articles',): len(articles), ('search_index',): len(local_index)})
+
+async def fetch_wiki_page(title=None, pageid=None):
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'formatversion': 2,
+        'prop': 'extracts|info|pageimages',
+        'explaintext': 1,
+        'exsectionformat': 'wiki',
+        'inprop': 'url',
+        'piprop': 'thumbnail',
+        'pithumbsize': WIKI_THUMB_SIZE,
+        'redirects': 1
+    }
+    if pageid is not None:
+        params['pageids'] = pageid
+    else:
+        params['titles'] = title
     
-    return patterns_found
-
-def format_wiki_text(text):
-    text = re.sub(r'======(.+?)======', r'**\1**', text)
-    text = re.sub(r'=====(.+?)=====', r'**\1**', text)
-    text = re.sub(r'====(.+?)====', r'**\1**', text)
-    text = re.sub(r'===(.+?)===', r'**\1**', text)
-    text = re.sub(r'==(.+?)==', r'**\1**', text)
-    text = re.sub(r"'''(.*?)'''", r'**\1**', text)
-    text = re.sub(r"''(.*?)''", r'*\1*', text)
-    text = re.sub(r'\[\[([^|\]]+)\|([^\]]+)\]\]', r'\2', text)
-    text = re.sub(r'\[\[([^\]]+)\]\]', r'\1', text)
-    text = re.sub(r'{{.*?}}', '', text)
-    text = re.sub(r'<.*?>', '', text)
-    text = re.sub(r'^\*+', '•', text, flags=re.MULTILINE)
-    text = re.sub(r' +', ' ', text)
-    text = re.sub(r'\n\s*\n', '\n\n', text)
-    
-    return text
-
-def split_text(text, max_length=4000):
-    if len(text) <= max_length:
-        return [text]
-    
-    parts = []
-    while text:
-        if len(text) <= max_length:
-            parts.append(text)
-            break
-        part = text[:max_length]
-        last_newline = part.rfind('\n')
-        if last_newline > 0:
-            part = part[:last_newline]
-        else:
-            last_space = part.rfind(' ')
-            if last_space > 0:
-                part = part[:last_space]
-        parts.append(part)
-        text = text[len(part):].strip()
-    return parts
-
-def get_page_image(page_title):
-    try:
-        url = "https://ru.wikipedia.org/api/rest_v1/page/summary/" + page_title.replace(" ", "_")
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if 'thumbnail' in data and 'source' in data['thumbnail']:
-                return data['thumbnail']['source']
+    status, data = await guards['wikipedia'].request(http.session, 'GET', WIKI_API_URL, params=params)
+    if status != 200:
         return None
-    except Exception as e:
-        logger.error(f"Error getting page image: {e}")
+    
+    pages = data.get('query', {}).get('pages', [])
+    if not pages:
         return None
+    
+    page = pages[0]
+    if page.get('missing') or page.get('invalid') or not page.get('extract'):
+        return None
+    
+    return {
+        'pageid': page['pageid'],
+        'title': page['title'],
+        'text': page['extract'],
+        'url': page.get('fullurl', ''),
+        'image_url': page.get('thumbnail', {}).get('source')
+    }
+
+async def fetch_related_titles(title):
+    params = {
+        'action': 'query',
+        'format': 'json',
+        'formatversion': 2,
+        'list': 'search',
+        'srsearch': f'morelike:{title}',
+        'srnamespace': 0,
+        'srlimit': WIKI_RELATED_LIMIT,
+        'srprop': ''
+    }
+    
+    status, data = await guards['wikipedia'].request(http.session, 'GET', WIKI_API_URL, params=params)
+    if status != 200:
+        return []
+    return [item['title'] for item in data.get('query', {}).get('search', [])]
 
 async def search_github(query):
-    try:
-        url = f"https://api.github.com/search/repositories?q={query}&sort=stars&order=desc"
-        headers = {'Accept': 'application/vnd.github.v3+json'}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = []
-                    for repo in data.get('items', [])[:3]:
-                        description = repo.get('description', 'Нет описания')
-                        if description is None:
-                            description = 'Нет описания'
-                        results.append({
-                            'title': repo['full_name'],
-                            'description': description[:200] + "..." if len(description) > 200 else description,
-                            'url': repo['html_url'],
-                            'stars': repo['stargazers_count'],
-                            'language': repo.get('language', 'Не указан'),
-                            'source': 'GitHub',
-                            'content': f"**{repo['full_name']}**\n\n⭐ **Звезды:** {repo['stargazers_count']}\n🖥 **Язык:** {repo.get('language', 'Не указан')}\n\n{description}\n\n🔗 [Открыть на GitHub]({repo['html_url']})"
-                        })
-                    return results
-                return []
-    except Exception as e:
-        logger.error(f"Error searching GitHub: {e}")
+    url = f"{GITHUB_SEARCH_URL}?q={query}&sort=stars&order=desc"
+    headers = {'Accept': 'application/vnd.github.v3+json'}
+    
+    status, data = await guards['github'].request(http.session, 'GET', url, headers=headers)
+    if status != 200:
         return []
+    
+    results = []
+    for repo in data.get('items', [])[:3]:
+        description = repo.get('description', 'Нет описания')
+        if description is None:
+            description = 'Нет описания'
+        results.append({
+            'title': repo['full_name'],
+            'description': description[:200] + "..." if len(description) > 200 else description,
+            'url': repo['html_url'],
+            'stars': repo['stargazers_count'],
+            'language': repo.get('language', 'Не указан'),
+            'source': 'GitHub',
+            'content': f"**{repo['full_name']}**\n\n⭐ **Звезды:** {repo['stargazers_count']}\n🖥 **Язык:** {repo.get('language', 'Не указан')}\n\n{description}\n\n🔗 [Открыть на GitHub]({repo['html_url']})"
+        })
+    return results
 
 async def search_stackoverflow(query):
-    try:
-        url = f"https://api.stackexchange.com/2.3/search/advanced"
-        params = {
-            'order': 'desc',
-            'sort': 'relevance',
-            'q': query,
-            'site': 'stackoverflow',
-            'pagesize': 3
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    results = []
-                    for item in data.get('items', [])[:3]:
-                        title = escape_markdown(item['title'])
-                        description = f"Ответов: {item['answer_count']}, Просмотров: {item['view_count']}"
-                        
-                        content = f"**{title}**\n\n**Рейтинг:** {item['score']}\n**Ответов:** {item['answer_count']}\n**Просмотров:** {item['view_count']}\n🏷 **Теги:** {', '.join(item['tags'][:5])}\n\n🔗 [Читать на StackOverflow]({item['link']})"
-                        
-                        results.append({
-                            'title': title,
-                            'description': description,
-                            'url': item['link'],
-                            'score': item['score'],
-                            'tags': ', '.join(item['tags'][:5]),
-                            'source': 'StackOverflow',
-                            'content': content
-                        })
-                    return results
-                return []
-    except Exception as e:
-        logger.error(f"Error searching StackOverflow: {e}")
+    url = STACKOVERFLOW_SEARCH_URL
+    params = {
+        'order': 'desc',
+        'sort': 'relevance',
+        'q': query,
+        'site': 'stackoverflow',
+        'pagesize': 3
+    }
+    
+    status, data = await guards['stackoverflow'].request(http.session, 'GET', url, params=params)
+    if status != 200:
         return []
+    
+    results = []
+    for item in data.get('items', [])[:3]:
+        title = escape_markdown(item['title'])
+        description = f"Ответов: {item['answer_count']}, Просмотров: {item['view_count']}"
+
+        content = f"**{title}**\n\n**Рейтинг:** {item['score']}\n**Ответов:** {item['answer_count']}\n**Просмотров:** {item['view_count']}\n🏷 **Теги:** {', '.join(item['tags'][:5])}\n\n🔗 [Читать на StackOverflow]({item['link']})"
+
+        results.append({
+            'title': title,
+            'description': description,
+            'url': item['link'],
+            'score': item['score'],
+            'tags': ', '.join(item['tags'][:5]),
+            'source': 'StackOverflow',
+            'content': content
+        })
+    return results
+
+@functools.cache
+def habr_parser():
+    # парсеры HTML (lxml, selectolax) загружаются при первом поиске по Habr
+    from habr import parse_habr_results
+    return parse_habr_results
 
 async def search_habr(query):
-    try:
-        url = f"https://habr.com/ru/search/"
-        params = {'q': query}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    results = []
-                    
-                    articles = soup.find_all('article', class_='tm-articles-list__item')[:3]
-                    for article in articles:
-                        title_elem = article.find('h2')
-                        if title_elem:
-                            title_link = title_elem.find('a')
-                            if title_link:
-                                title = escape_markdown(title_link.text.strip())
-                                link = "https://habr.com" + title_link['href']
-                            
-                                description_elem = article.find(['div', 'p'], class_=re.compile('article-formatted-body'))
-                                description = ""
-                                if description_elem:
-                                    description = escape_markdown(description_elem.text.strip()[:200] + "...")
-                                else:
-                                    description = "Читать на Habr"
-                                
-                                content = f"**{title}**\n\n{description}\n\n🔗 [Читать на Habr]({link})"
-                                
-                                results.append({
-                                    'title': title,
-                                    'description': description,
-                                    'url': link,
-                                    'source': 'Habr',
-                                    'content': content
-                                })
-                    
-                    return results
-                return []
-    except Exception as e:
-        logger.error(f"Error searching Habr: {e}")
+    url = HABR_SEARCH_URL
+    params = {'q': query}
+    
+    status, html = await guards['habr'].request(http.session, 'GET', url, parse='text', params=params)
+    if status != 200:
         return []
-
-def get_wiki_page(query):
-    try:
-        page = wiki_wiki.page(query)
-        if not page.exists():
-            return None
-        
-        formatted_text = format_wiki_text(page.text)
-        
-        text_chunks = split_text(formatted_text, 3000)
-        
-        if len(text_chunks) > 10:
-            text_chunks = text_chunks[:10]
-            text_chunks[-1] += "\n\n*Текст сокращен*"
-        
-        image_url = get_page_image(page.title)
-        
-        return {
-            'title': page.title,
-            'chunks': text_chunks,
-            'image_url': image_url,
-            'url': page.fullurl,
-            'source': 'Wikipedia'
-        }
     
-    except Exception as e:
-        logger.error(f"Error getting wiki page: {e}")
+    return await run_cpu(habr_parser(), html)
+
+def split_wiki_text(text):
+    with timer(SPLIT_SECONDS, span='split'):
+        return split_offsets(text, WIKI_CHUNK_SIZE)
+
+async def get_wiki_page(query=None, pageid=None):
+    page = await fetch_wiki_page(query, pageid)
+    if page is None:
         return None
+    
+    page_data = {
+        'pageid': page['pageid'],
+        'title': page['title'],
+        'text': page['text'],
+        'offsets': split_wiki_text(page['text']),
+        'image_url': page['image_url'],
+        'url': page['url'],
+        'source': 'Wikipedia'
+    }
+    if pageid is None:
+        # по pageid страницу найдет любой воркер, нажавший кнопку навигации
+        cache.set('wikipage', str(page['pageid']), page_data)
+    return page_data
+
+async def get_wiki_page_by_id(pageid):
+    return await cache.cached('wikipage', str(pageid), lambda subject: get_wiki_page(pageid=int(subject)))
+
+def article_key(url):
+    return hashlib.blake2b(url.encode(), digest_size=8).digest()
+
+def split_article(content):
+    with timer(SPLIT_SECONDS, span='split'):
+        return split_offsets(content, ARTICLE_CHUNK_SIZE)
+
+def store_article(result):
+    key = article_key(result['url'])
+    existing = articles.get(key.hex())
+    if existing is not None and existing.offsets is not None and existing.content == result['content']:
+        # та же статья уже открывалась: разбивку на страницы не пересчитываем
+        offsets = existing.offsets
+    else:
+        offsets = split_article(result['content'])
+    articles.set(key.hex(), Article(
+        content=result['content'],
+        title=result['title'],
+        source=result['source'],
+        url=result['url'],
+        offsets=offsets
+    ))
+    return key
+
+def get_wiki_chunk(page_data, chunk_index):
+    start, end = page_data['offsets'][chunk_index]
+    # после правки статьи разбивка меняется: ключ учитывает обе границы куска
+    key = f"{page_data['url']}#{start}-{end}"
+    chunk_text = chunk_cache.get(key)
+    if chunk_text is MISSING:
+        with timer(FORMAT_SECONDS, span='format'):
+            chunk_text = format_wiki_chunk(page_data['text'], start, end)
+        chunk_cache.set(key, chunk_text, cache.ttl_for('wikipedia'))
+    return chunk_text
+
+def create_providers():
+    # веса по типам запроса из QUERY_PATTERNS: например, GitHub про историю не спрашиваем.
+    # Цена учитывает квоты: у GitHub без токена всего 10 запросов в минуту
+    registry = ProviderRegistry()
+    registry.register(Provider('wikipedia', 'Wikipedia', get_wiki_page, timeout=8, cost=1, intents={
+        'definition': 3, 'history': 3, 'why': 2, 'compare': 1, 'general': 3
+    }))
+    registry.register(Provider('stackoverflow', 'StackOverflow', search_stackoverflow, timeout=6, cost=2, intents={
+        'how_to': 3, 'why': 2, 'compare': 2, 'examples': 2, 'definition': 1, 'general': 2
+    }))
+    registry.register(Provider('github', 'GitHub', search_github, timeout=6, cost=3, intents={
+        'examples': 3, 'how_to': 2, 'general': 1
+    }))
+    registry.register(Provider('habr', 'Habr', search_habr, timeout=8, cost=2, intents={
+        'how_to': 2, 'why': 2, 'compare': 2, 'history': 1, 'examples': 1, 'definition': 1, 'general': 1
+    }))
+    return registry
+
+def prefetch_next_chunk(page_data, chunk_index):
+    next_chunk = chunk_index + 1
+    if next_chunk >= len(page_data['offsets']):
+        return
+    
+    async def prebuild():
+        get_wiki_chunk(page_data, next_chunk)
+    
+    prefetcher.schedule('chunk', f"{page_data['url']}#{next_chunk}", prebuild)
+
+async def prefetch_related(title):
+    guard = guards['wikipedia']
+    if not guard.has_capacity(PREFETCH_RESERVE):
+        return
+    for related in await fetch_related_titles(title):
+        if cache.peek('wikipedia', related) is not MISSING or not guard.has_capacity(PREFETCH_RESERVE):
+            continue
+        try:
+            page_data = await cache.refresh('wikipedia', related, get_wiki_page)
+        except SourceUnavailable:
+            # источник перегружен или выключен: остальные темы тоже не подкачиваем
+            return
+        except Exception as e:
+            logger.warning(f"Prefetch of related page {related} failed: {e!r}")
+            continue
+        if page_data:
+            suggestions.add(related)
+            local_index.add('wikipedia', page_data)
+
+async def refresh_source(provider, subject):
+    if guards[provider.name].has_capacity(PREFETCH_RESERVE):
+        await cache.refresh(provider.name, subject, provider.fetch)
+
+def warm_trending():
+    # популярные темы обновляются заранее, пока их записи в кеше не истекли
+    for subject, intents in trending.top(TRENDING_TOP):
+        # только источники, которые спрашиваются по этой теме: остальных в кеше и не должно быть
+        for provider in providers.select(intents):
+            if cache.ttl_left(provider.name, subject) < TRENDING_REFRESH_INTERVAL * 2:
+                prefetcher.schedule(
+                    'trending', f"{provider.name}:{subject}", functools.partial(refresh_source, provider, subject)
+                )
+    trending.decay_scores()
+
+prefetcher.every(TRENDING_REFRESH_INTERVAL, warm_trending)
 
-async def send_wiki_page(message: Message, page_data, chunk_index=0):
-    total_chunks = len(page_data['chunks'])
+async def send_wiki_page(message: Message, page_data, chunk_index=0, priority=PRIORITY_RESULTS):
+    total_chunks = len(page_data['offsets'])
+    chunk_text = get_wiki_chunk(page_data, chunk_index)
 
     message_text = f"*{page_data['title']}* | {page_data['source']}\n\n"
-    message_text += page_data['chunks'][chunk_index]
+    message_text += chunk_text
     message_text += f"\n\nСтраница {chunk_index + 1} из {total_chunks}"
     message_text += f"\n[Открыть оригинал]({page_data['url']})"
     
     if len(message_text) > 4096:
         excess = len(message_text) - 4096
-        content = page_data['chunks'][chunk_index]
+        content = chunk_text
         content = content[:len(content) - excess - 100] + "*Текст сокращен*"
         message_text = f"*{page_data['title']}* | {page_data['source']}\n\n{content}"
         message_text += f"\n\nСтраница {chunk_index + 1} из {total_chunks}"
@@ -276,147 +399,278 @@ async def send_wiki_page(message: Message, page_data, chunk_index=0):
     keyboard = InlineKeyboardBuilder()
     
     if chunk_index > 0:
-        keyboard.button(text="◀ Предыдущая", callback_data=f"prev_{chunk_index}")
+        keyboard.button(
+            text="◀ Предыдущая", callback_data=callbacks.encode_wiki_page(page_data['pageid'], chunk_index - 1)
+        )
     if chunk_index < total_chunks - 1:
-        keyboard.button(text="Следующая ▶", callback_data=f"next_{chunk_index}")
+        keyboard.button(
+            text="Следующая ▶", callback_data=callbacks.encode_wiki_page(page_data['pageid'], chunk_index + 1)
+        )
     
     keyboard.adjust(2)
     
+    chat_id = message.chat.id
     try:
         if chunk_index == 0 and page_data.get('image_url'):
             caption = f"*{page_data['title']}* | {page_data['source']}\n\n"
-            first_paragraph = page_data['chunks'][0].split('\n\n')[0]
+            first_paragraph = chunk_text.split('\n\n')[0]
             if len(first_paragraph) > 300:
                 caption += first_paragraph[:300] + "..."
             else:
                 caption += first_paragraph
             caption += f"\n\nСтраница 1 из {total_chunks}"
             
-            await message.answer_photo(
+            await sender.send(chat_id, functools.partial(
+                message.answer_photo,
                 photo=page_data['image_url'],
                 caption=caption,
                 reply_markup=keyboard.as_markup(),
                 parse_mode=ParseMode.MARKDOWN
-            )
+            ), priority)
         else:
-            await message.answer(
+            await sender.send(chat_id, functools.partial(
+                message.answer,
                 text=message_text,
                 reply_markup=keyboard.as_markup(),
                 parse_mode=ParseMode.MARKDOWN
-            )
-    except Exception as e:
+            ), priority)
+    except TelegramBadRequest as e:
+        # картинку или разметку Telegram не принял: пробуем обычным сообщением
         logger.error(f"Error sending message: {e}")
-        await message.answer(
+        TELEGRAM_RETRIES.inc()
+        await sender.send(chat_id, functools.partial(
+            message.answer,
             text=message_text,
             reply_markup=keyboard.as_markup(),
             parse_mode=ParseMode.MARKDOWN
-        )
+        ), priority)
+    except Exception as e:
+        logger.error(f"Error sending message: {e}")
 
-async def send_source_results(message: Message, results, source_name):
+async def send_source_results(message: Message, results, source_name, priority=PRIORITY_RESULTS):
     if not results:
         return
     
-    for result in results:
+    # все результаты источника уходят одним сообщением
+    blocks = []
+    keyboard = InlineKeyboardBuilder()
+    
+    for number, result in enumerate(results, 1):
         safe_title = escape_markdown(result['title'])
         safe_description = escape_markdown(result['description'])
         
-        result_text = f"**{safe_title}** | {result['source']}\n\n"
-        result_text += f"{safe_description}\n\n"
+        block = f"{number}. **{safe_title}**\n{safe_description}"
         
         if result['source'] == 'GitHub':
-            result_text += f" Звезды: {result['stars']} |  Язык: {result['language']}\n"
+            block += f"\n Звезды: {result['stars']} |  Язык: {result['language']}"
         elif result['source'] == 'StackOverflow':
-            result_text += f" Рейтинг: {result['score']} |  Теги: {result['tags']}\n"
+            block += f"\n Рейтинг: {result['score']} |  Теги: {result['tags']}"
+        blocks.append(block)
         
-        keyboard = InlineKeyboardBuilder()
-        keyboard.button(text=f" Открыть в {result['source']}", url=result['url'])
+        buttons = [InlineKeyboardButton(text=f"{number}. Открыть в {result['source']}", url=result['url'])]
         
         if 'content' in result:
-            article_id = str(uuid.uuid4())[:8]
-            user_articles[article_id] = {
-                'content': result['content'],
-                'title': result['title'],
-                'source': result['source'],
-                'url': result['url']
-            }
-            keyboard.button(text=" Читать тут", callback_data=f"read_{article_id}")
-        
-        keyboard.adjust(1)
+            key = store_article(result)
+            buttons.append(InlineKeyboardButton(
+                text=f"{number}. Читать тут", callback_data=callbacks.encode(ARTICLE_READ, key)
+            ))
         
-        try:
-            await message.answer(
-                text=result_text,
-                reply_markup=keyboard.as_markup(),
-                parse_mode=ParseMode.MARKDOWN
-            )
-        except Exception as e:
-            logger.error(f"Error sending result: {e}")
-            await message.answer(
-                text=result_text.replace('*', '').replace('_', ''),
-                reply_markup=keyboard.as_markup()
-            )
+        keyboard.row(*buttons)
+    
+    result_text = f"*{source_name}*\n\n" + "\n\n".join(blocks)
+    chat_id = message.chat.id
+    
+    try:
+        await sender.send(chat_id, functools.partial(
+            message.answer,
+            text=result_text,
+            reply_markup=keyboard.as_markup(),
+            parse_mode=ParseMode.MARKDOWN
+        ), priority)
+    except TelegramBadRequest as e:
+        logger.error(f"Error sending result: {e}")
+        TELEGRAM_RETRIES.inc()
+        await sender.send(chat_id, functools.partial(
+            message.answer,
+            text=result_text.replace('*', '').replace('_', ''),
+            reply_markup=keyboard.as_markup()
+        ), priority)
+    except Exception as e:
+        logger.error(f"Error sending result: {e}")
 
-async def send_article_content(message: Message, article_id, chunk_index=0):
-    if article_id not in user_articles:
-        await message.answer("Статья не найдена.")
+async def send_article_content(message: Message, key, chunk_index=0):
+    article = articles.get(key.hex())
+    if article is None:
+        await sender.send(message.chat.id, functools.partial(message.answer, "Статья не найдена."))
         return
     
-    article = user_articles[article_id]
-    content_chunks = split_text(article['content'], 3000)
-    total_chunks = len(content_chunks)
+    if article.offsets is None:
+        article.offsets = split_article(article.content)
+        articles.set(key.hex(), article)
+    total_chunks = len(article.offsets)
     
     if chunk_index >= total_chunks:
         chunk_index = total_chunks - 1
     
-    message_text = content_chunks[chunk_index]
+    start, end = article.offsets[chunk_index]
+    message_text = article.content[start:end]
     message_text += f"\n\n*Страница {chunk_index + 1} из {total_chunks}*"
     
     keyboard = InlineKeyboardBuilder()
     
     if chunk_index > 0:
-        keyboard.button(text="◀ Назад", callback_data=f"art_prev_{article_id}_{chunk_index}")
+        keyboard.button(text="◀ Назад", callback_data=callbacks.encode(ARTICLE_PAGE, key, chunk_index - 1))
     if chunk_index < total_chunks - 1:
-        keyboard.button(text="Далее ▶", callback_data=f"art_next_{article_id}_{chunk_index}")
+        keyboard.button(text="Далее ▶", callback_data=callbacks.encode(ARTICLE_PAGE, key, chunk_index + 1))
     
-    keyboard.button(text="🔗 Открыть оригинал", url=article['url'])
+    keyboard.button(text="🔗 Открыть оригинал", url=article.url)
     keyboard.adjust(2, 1)
     
+    chat_id = message.chat.id
     try:
-        await message.answer(
+        await sender.send(chat_id, functools.partial(
+            message.answer,
             text=message_text,
             reply_markup=keyboard.as_markup(),
             parse_mode=ParseMode.MARKDOWN
-        )
-    except Exception as e:
+        ))
+    except TelegramBadRequest as e:
         logger.error(f"Error sending article content: {e}")
-        await message.answer(
+        TELEGRAM_RETRIES.inc()
+        await sender.send(chat_id, functools.partial(
+            message.answer,
             text=message_text.replace('*', '').replace('_', ''),
             reply_markup=keyboard.as_markup()
-        )
+        ))
+    except Exception as e:
+        logger.error(f"Error sending article content: {e}")
 
-@dp.message(Command("start"))
 async def cmd_start(message: Message):
-    await message.answer(
+    await sender.send(message.chat.id, functools.partial(
+        message.answer,
         " *Бот-поискови*\n\n"
-        "Отправьте мне запрос, и я найду информацию в:\n"
+        "Отправьте мне запрос, и я найду информацию в подходящих источниках:\n"
         "•  Wikipedia\n"
         "•  GitHub\n"
         "•  StackOverflow\n"
         "•  Habr\n\n"
-        "Я автоматически анализирую структуру вашего запроса и ищу наиболее релевантную информацию!\n\n"
+        "Я автоматически анализирую структуру вашего запроса и ищу только там, где ответ вероятнее всего: "
+        "\"как сделать\" и примеры кода - в StackOverflow, GitHub и Habr, историю - в Wikipedia и Habr.\n\n"
         "`by yoxiko`",
         parse_mode=ParseMode.MARKDOWN
+    ))
+
+async def fetch_source(provider, subject, deadline=None):
+    source = provider.name
+    if deadline is None:
+        deadline = provider.timeout
+    
+    # в гистограмму попадают только реальные походы в источник, без попаданий в кэш
+    async def timed_fetch(subject):
+        with timer(SOURCE_FETCH_SECONDS, span=f"fetch.{source}", source=source):
+            result = await provider.fetch(subject)
+        # индексируются только свежие ответы источника, попадания в кэш уже в индексе
+        if result:
+            local_index.add(source, result)
+        return result
+    
+    # опоздавший запрос не отменяется: он дозаполнит кэш для следующих поисков.
+    # Отмена самого поиска отменяет и запрос, если его больше никто не ждет
+    lookup = asyncio.ensure_future(cache.cached(source, subject, timed_fetch))
+    try:
+        done, _ = await asyncio.wait({lookup}, timeout=deadline)
+    except asyncio.CancelledError:
+        lookup.cancel()
+        raise
+    if not done:
+        lookup.add_done_callback(lambda task: task.cancelled() or task.exception())
+        logger.warning(f"Source {source} missed its {deadline}s deadline")
+        SOURCE_RESULTS.inc(source=source, outcome='timeout')
+        return source, SOURCE_TIMEOUT
+    try:
+        result = lookup.result()
+    except SourceUnavailable as e:
+        logger.warning(f"Skipping {provider.title}: {e}")
+        SOURCE_RESULTS.inc(source=source, outcome='error')
+        return source, None
+    except Exception as e:
+        logger.error(f"Error in {source} search: {e}")
+        SOURCE_RESULTS.inc(source=source, outcome='error')
+        return source, None
+    SOURCE_RESULTS.inc(source=source, outcome='found' if result else 'empty')
+    if result:
+        suggestions.add(subject)
+    return source, result
+
+async def answer_locally(provider, hit, subject):
+    SOURCE_RESULTS.inc(source=provider.name, outcome='local')
+    if provider.name != 'wikipedia':
+        return provider.name, hit
+    try:
+        page_data = await get_wiki_page_by_id(hit)
+    except Exception as e:
+        logger.warning(f"Local Wikipedia hit {hit} is unavailable: {e}")
+        page_data = None
+    if not page_data:
+        return await fetch_source(provider, subject)
+    return provider.name, page_data
+
+def drop_seen_results(results, seen_urls):
+    # одна и та же ссылка из разных источников показывается один раз
+    results = [result for result in results if result['url'] not in seen_urls]
+    seen_urls.update(result['url'] for result in results)
+    return results
+
+def search_status_key(search_message: Message):
+    # промежуточные статусы, не успевшие уйти, заменяются последним
+    return f"status_{search_message.message_id}"
+
+def log_status_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error updating search status: {future.exception()}")
+
+def update_search_status(search_message: Message, states):
+    status_text = " Поиск информации по подходящим источникам...\n"
+    for source, state in states.items():
+        status_text += f"\n{SEARCH_STATUS_ICONS[state]} {providers[source].title}"
+    
+    # ставится в очередь сразу, без отдельной задачи: итоговый запрос с тем же
+    # ключом, поставленный позже, гарантированно окажется последним
+    future = sender.submit(
+        search_message.chat.id,
+        functools.partial(search_message.edit_text, status_text),
+        PRIORITY_STATUS,
+        key=search_status_key(search_message)
     )
+    future.add_done_callback(log_status_error)
+
+def run_detached(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def discard_search_status(chat_id, search_message: Message):
+    try:
+        await sender.send(chat_id, search_message.delete, PRIORITY_STATUS, key=search_status_key(search_message))
+    except Exception as e:
+        logger.error(f"Error removing search status: {e}")
 
-@dp.message(F.text)
 async def handle_text(message: Message):
-    user_id = message.from_user.id
     query = message.text.strip()
     
     if len(query) < 2:
-        await message.answer("Запрос слишком короткий. Попробуйте еще раз.")
+        await sender.send(message.chat.id, functools.partial(
+            message.answer, "Запрос слишком короткий. Попробуйте еще раз."
+        ))
         return
     
+    # новый запрос пользователя отменяет его предыдущий поиск
+    user_id = message.from_user.id if message.from_user else message.chat.id
+    if not await searches.run(user_id, functools.partial(run_search, message, query)):
+        logger.info(f"Search superseded by a newer query from user {user_id}")
+
+async def run_search(message: Message, query):
     patterns = analyze_query_patterns(query)
     
     analysis_msg = " *Анализ запроса:*\n"
@@ -424,98 +678,127 @@ async def handle_text(message: Message):
         safe_subject = escape_markdown(pattern['subject'])
         analysis_msg += f"• **{pattern['type']}**: {safe_subject}\n"
     
+    chat_id = message.chat.id
     try:
-        await message.answer(analysis_msg, parse_mode=ParseMode.MARKDOWN)
-    except Exception as e:
+        await sender.send(chat_id, functools.partial(message.answer, analysis_msg, parse_mode=ParseMode.MARKDOWN))
+    except TelegramBadRequest as e:
         logger.error(f"Error sending analysis: {e}")
-        await message.answer(analysis_msg.replace('*', '').replace('_', ''))
+        TELEGRAM_RETRIES.inc()
+        await sender.send(chat_id, functools.partial(message.answer, analysis_msg.replace('*', '').replace('_', '')))
     
-    search_message = await message.answer(" Поиск информации по всем источникам...")
+    search_message = await sender.send(
+        chat_id, functools.partial(message.answer, " Поиск информации по подходящим источникам...")
+    )
     
     main_subject = patterns[0]['subject']
+    intents = {pattern['type'] for pattern in patterns}
+    trending.record(main_subject, intents)
     
-    wiki_task = asyncio.create_task(asyncio.to_thread(get_wiki_page, main_subject))
-    github_task = asyncio.create_task(search_github(main_subject))
-    stackoverflow_task = asyncio.create_task(search_stackoverflow(main_subject))
-    habr_task = asyncio.create_task(search_habr(main_subject))
+    # спрашиваем только источники, подходящие к типу запроса, от лучшего к худшему
+    selected = providers.select(intents)
+    # источники, на которые уверенно отвечает локальный индекс, наружу не спрашиваем
+    local_hits = local_index.search(main_subject)
+    states = {provider.name: 'pending' for provider in selected}
+    # ответ более подходящего источника уходит раньше, если в очереди чата их несколько
+    priorities = {
+        provider.name: PRIORITY_RESULTS + rank / len(selected) for rank, provider in enumerate(selected)
+    }
+    tasks = [
+        asyncio.create_task(
+            answer_locally(provider, local_hits[provider.name], main_subject) if provider.name in local_hits
+            else fetch_source(provider, main_subject)
+        )
+        for provider in selected
+    ]
     
-    wiki_data, github_results, stackoverflow_results, habr_results = await asyncio.gather(
-        wiki_task, github_task, stackoverflow_task, habr_task,
-        return_exceptions=True
-    )
+    found_any = False
+    status_open = True
+    # отправка идет через очередь и не задерживает разбор следующих источников
+    sends = []
+    seen_urls = set()
     
-    if isinstance(wiki_data, Exception):
-        logger.error(f"Error in wiki search: {wiki_data}")
-        wiki_data = None
-    if isinstance(github_results, Exception):
-        logger.error(f"Error in github search: {github_results}")
-        github_results = []
-    if isinstance(stackoverflow_results, Exception):
-        logger.error(f"Error in stackoverflow search: {stackoverflow_results}")
-        stackoverflow_results = []
-    if isinstance(habr_results, Exception):
-        logger.error(f"Error in habr search: {habr_results}")
-        habr_results = []
-    
-    await search_message.delete()
-    
-    all_results = []
-    
-    if wiki_data:
-        user_sessions[user_id] = {
-            'page_data': wiki_data,
-            'current_chunk': 0
-        }
-        await send_wiki_page(message, wiki_data, 0)
-        all_results.append(wiki_data)
-    
-    if github_results:
-        await send_source_results(message, github_results, "GitHub")
-        all_results.extend(github_results)
-    
-    if stackoverflow_results:
-        await send_source_results(message, stackoverflow_results, "StackOverflow")
-        all_results.extend(stackoverflow_results)
-    
-    if habr_results:
-        await send_source_results(message, habr_results, "Habr")
-        all_results.extend(habr_results)
-    
-    if not all_results:
-        await message.answer(" По вашему запросу ничего не найдено. Попробуйте другой запрос.")
-
-@dp.callback_query(F.data.startswith("prev_") | F.data.startswith("next_"))
-async def handle_navigation(callback: CallbackQuery):
-    user_id = callback.from_user.id
-    
-    if user_id not in user_sessions:
-        await callback.answer("Сессия истекла. Начните новый поиск.", show_alert=True)
-        return
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            source, data = await next_done
+            
+            if data and data is not SOURCE_TIMEOUT and source != 'wikipedia':
+                data = drop_seen_results(data, seen_urls)
+            
+            if data is SOURCE_TIMEOUT:
+                states[source] = 'late'
+            elif not data:
+                states[source] = 'empty'
+            else:
+                states[source] = 'found'
+                found_any = True
+                if source == 'wikipedia':
+                    sends.append(asyncio.create_task(send_wiki_page(message, data, 0, priorities[source])))
+                    prefetch_next_chunk(data, 0)
+                    prefetcher.schedule('related', data['title'], functools.partial(prefetch_related, data['title']))
+                else:
+                    sends.append(asyncio.create_task(
+                        send_source_results(message, data, providers[source].title, priorities[source])
+                    ))
+            
+            update_search_status(search_message, states)
+        
+        late_sources = [providers[source].title for source, state in states.items() if state == 'late']
+        
+        try:
+            if late_sources:
+                finalize = functools.partial(
+                    search_message.edit_text,
+                    " Поиск завершен.\n\nНе успели ответить вовремя: " + ", ".join(late_sources)
+                )
+            else:
+                finalize = search_message.delete
+            await sender.send(chat_id, finalize, PRIORITY_STATUS, key=search_status_key(search_message))
+            status_open = False
+        except Exception as e:
+            logger.error(f"Error finalizing search status: {e}")
+        
+        await asyncio.gather(*sends)
+    except asyncio.CancelledError:
+        # поиск вытеснен: запросы к источникам и неотправленные сообщения больше не нужны
+        for task in tasks + sends:
+            task.cancel()
+        if status_open:
+            run_detached(discard_search_status(chat_id, search_message))
+        raise
     
-    session = user_sessions[user_id]
-    page_data = session['page_data']
-    current_chunk = session['current_chunk']
+    if not found_any:
+        await sender.send(chat_id, functools.partial(
+            message.answer, " По вашему запросу ничего не найдено. Попробуйте другой запрос."
+        ))
+
+async def handle_navigation(callback: CallbackQuery, payload):
+    try:
+        page_data = await get_wiki_page_by_id(payload.pageid)
+    except Exception as e:
+        logger.error(f"Error loading wiki page {payload.pageid}: {e}")
+        await callback.answer("Wikipedia сейчас недоступна. Попробуйте позже.", show_alert=True)
+        return
+    if not page_data:
+        await callback.answer("Страница больше недоступна. Начните новый поиск.", show_alert=True)
+        return
     
-    if callback.data.startswith("prev_"):
-        new_chunk = current_chunk - 1
-    else:  
-        new_chunk = current_chunk + 1
-        
-    if new_chunk < 0 or new_chunk >= len(page_data['chunks']):
+    new_chunk = payload.index
+    total_chunks = len(page_data['offsets'])
+    if new_chunk >= total_chunks:
         await callback.answer("Достигнут предел навигации.")
         return
     
-    session['current_chunk'] = new_chunk
+    prefetch_next_chunk(page_data, new_chunk)
     
-    total_chunks = len(page_data['chunks'])
+    chunk_text = get_wiki_chunk(page_data, new_chunk)
     message_text = f"*{page_data['title']}* | {page_data['source']}\n\n"
-    message_text += page_data['chunks'][new_chunk]
+    message_text += chunk_text
     message_text += f"\n\nСтраница {new_chunk + 1} из {total_chunks}"
     message_text += f"\n[Открыть оригинал]({page_data['url']})"
     
     if len(message_text) > 4096:
         excess = len(message_text) - 4096
-        content = page_data['chunks'][new_chunk]
+        content = chunk_text
         content = content[:len(content) - excess - 100] + "*Текст сокращен*"
         message_text = f"*{page_data['title']}* | {page_data['source']}\n\n{content}"
         message_text += f"\n\nСтраница {new_chunk + 1} из {total_chunks}"
@@ -523,51 +806,119 @@ async def handle_navigation(callback: CallbackQuery):
     
     keyboard = InlineKeyboardBuilder()
     if new_chunk > 0:
-        keyboard.button(text="◀ Предыдущая", callback_data=f"prev_{new_chunk}")
+        keyboard.button(text="◀ Предыдущая", callback_data=callbacks.encode_wiki_page(payload.pageid, new_chunk - 1))
     if new_chunk < total_chunks - 1:
-        keyboard.button(text="Следующая ▶", callback_data=f"next_{new_chunk}")
+        keyboard.button(text="Следующая ▶", callback_data=callbacks.encode_wiki_page(payload.pageid, new_chunk + 1))
     
     keyboard.adjust(2)
     
     try:
-        await callback.message.edit_text(
+        # быстрые перелистывания одного сообщения схлопываются в последнее
+        await sender.send(callback.message.chat.id, functools.partial(
+            callback.message.edit_text,
             text=message_text,
             reply_markup=keyboard.as_markup(),
             parse_mode=ParseMode.MARKDOWN
-        )
+        ), key=f"page_{callback.message.message_id}")
         await callback.answer()
     except Exception as e:
         logger.error(f"Error editing message: {e}")
         await callback.answer("Ошибка при обновлении сообщения.", show_alert=True)
 
-@dp.callback_query(F.data.startswith("read_"))
-async def handle_read_article(callback: CallbackQuery):
-    article_id = callback.data.replace("read_", "")
+async def handle_read_article(callback: CallbackQuery, payload):
     await callback.answer()
-    await send_article_content(callback.message, article_id, 0)
+    await send_article_content(callback.message, payload.key, 0)
 
-@dp.callback_query(F.data.startswith("art_prev_") | F.data.startswith("art_next_"))
-async def handle_article_navigation(callback: CallbackQuery):
-    try:
-        data_parts = callback.data.split("_")
-        direction = data_parts[1] 
-        article_id = data_parts[2]
-        current_chunk = int(data_parts[3])
-        
-        if direction == "prev":
-            new_chunk = current_chunk - 1
+async def handle_article_navigation(callback: CallbackQuery, payload):
+    await callback.answer()
+    await send_article_content(callback.message, payload.key, payload.index)
+
+async def handle_stale_callback(callback: CallbackQuery):
+    # кнопки старого формата или с неверной подписью
+    await callback.answer("Кнопка устарела. Начните новый поиск.", show_alert=True)
+
+def inline_result_id(source, url):
+    return f"{source}:{hashlib.md5(url.encode()).hexdigest()[:16]}"
+
+def wiki_inline_result(page_data):
+    chunk_text = get_wiki_chunk(page_data, 0)
+    header = f"*{page_data['title']}* | {page_data['source']}\n\n"
+    footer = f"\n\n[Открыть оригинал]({page_data['url']})"
+    room = 4096 - len(header) - len(footer)
+    if len(chunk_text) > room:
+        chunk_text = chunk_text[:room - 20] + "*Текст сокращен*"
+    
+    return InlineQueryResultArticle(
+        id=inline_result_id('wikipedia', page_data['url']),
+        title=page_data['title'],
+        description=chunk_text[:100],
+        url=page_data['url'],
+        thumbnail_url=page_data.get('image_url'),
+        input_message_content=InputTextMessageContent(
+            message_text=header + chunk_text + footer,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    )
+
+def source_inline_result(source, result):
+    return InlineQueryResultArticle(
+        id=inline_result_id(source, result['url']),
+        title=f"{unescape_markdown(result['title'])} | {result['source']}",
+        description=unescape_markdown(result['description'])[:100],
+        url=result['url'],
+        input_message_content=InputTextMessageContent(
+            message_text=result['content'][:4096],
+            parse_mode=ParseMode.MARKDOWN
+        )
+    )
+
+def cached_inline_results(subject):
+    results = []
+    for provider in providers:
+        source = provider.name
+        data = cache.peek(source, subject)
+        if data is MISSING or not data:
+            continue
+        if source == 'wikipedia':
+            results.append(wiki_inline_result(data))
         else:
-            new_chunk = current_chunk + 1
-        
-        await callback.answer()
-        await send_article_content(callback.message, article_id, new_chunk)
+            results.extend(source_inline_result(source, result) for result in data)
+    return results
+
+async def handle_inline_query(inline_query: InlineQuery):
+    query = inline_query.query.strip()
+    if len(query) < 2:
+        await inline_query.answer([], cache_time=INLINE_EMPTY_CACHE_TIME)
+        return
+    
+    subject = analyze_query_patterns(query)[0]['subject']
+    
+    results = []
+    seen = set()
+    for suggestion in suggestions.lookup(subject, INLINE_MAX_SUBJECTS):
+        for result in cached_inline_results(suggestion):
+            if result.id not in seen:
+                seen.add(result.id)
+                results.append(result)
+    
+    if not results:
+        # в индексе ничего нет: спрашиваем только быструю Wikipedia, остальные
+        # источники подтянутся, когда тему найдут обычным поиском
+        _, data = await fetch_source(providers['wikipedia'], subject, INLINE_FALLBACK_DEADLINE)
+        if data and data is not SOURCE_TIMEOUT:
+            results = cached_inline_results(subject)
+    
+    try:
+        await inline_query.answer(
+            results[:INLINE_MAX_RESULTS],
+            cache_time=INLINE_CACHE_TIME if results else INLINE_EMPTY_CACHE_TIME
+        )
     except Exception as e:
-        logger.error(f"Error in article navigation: {e}")
-        await callback.answer("Ошибка навигации", show_alert=True)
+        logger.error(f"Error answering inline query: {e}")
 
-@dp.message(Command("help"))
 async def cmd_help(message: Message):
-    await message.answer(
+    await sender.send(message.chat.id, functools.partial(
+        message.answer,
         " *Помощь по боту*\n\n"
         "Я могу найти информацию в нескольких источниках:\n"
         "•  *Wikipedia* - энциклопедические статьи\n"
@@ -577,7 +928,7 @@ async def cmd_help(message: Message):
         "*Как использовать:*\n"
         "Просто отправьте мне любой запрос, и я автоматически:\n"
         "1.  Проанализирую структуру запроса\n"
-        "2.  Найду информацию во всех источниках\n"
+        "2.  Найду информацию в источниках, подходящих к типу запроса\n"
         "3.  Покажу наиболее релевантные результаты\n\n"
         "*Примеры запросов:*\n"
         "• \"что такое искусственный интеллект\"\n"
@@ -586,20 +937,121 @@ async def cmd_help(message: Message):
         "• \"разница между list и tuple в Python\"\n\n"
         "*Команды:*\n"
         "/start - начать работу\n"
-        "/help - показать эту справку",
+        "/help - показать эту справку\n\n"
+        "Искать можно и из любого чата: наберите @имя бота и запрос",
         parse_mode=ParseMode.MARKDOWN
-    )
+    ))
 
-@dp.message()
 async def handle_other_messages(message: Message):
-    await message.answer(
+    await sender.send(message.chat.id, functools.partial(
+        message.answer,
         "Я понимаю только текстовые сообщения. "
         "Просто напишите, что хотите найти, или используйте /help для справки."
-    )
+    ))
+
+def open_stores():
+    global cache, articles, local_index
+    if cache is None:
+        cache = ResultCache()
+        articles = create_store('articles', Article, ARTICLE_TTL, ARTICLE_MAX_ENTRIES)
+        local_index = LocalIndex(ttls=cache.ttls)
+
+def close_stores():
+    global cache, articles, local_index
+    if cache is None:
+        return
+    logger.info(f"Cache stats: {cache.stats()}")
+    cache.close()
+    articles.close()
+    local_index.close()
+    cache = articles = local_index = None
+
+async def on_startup():
+    global metrics_runner
+    open_stores()
+    await http.start()
+    await sender.start()
+    await prefetcher.start()
+    start_cpu_pool()
+    # в режиме webhook /metrics уже висит на основном приложении
+    if BOT_MODE != "webhook" and METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_PORT)
+
+async def on_shutdown():
+    global metrics_runner
+    # в режиме webhook Telegram уже получил 200 на эти апдейты: без ожидания они потеряются
+    unfinished = await concurrency_limit.wait_idle(SHUTDOWN_UPDATES_TIMEOUT)
+    if unfinished:
+        logger.warning(f"{unfinished} updates still running after {SHUTDOWN_UPDATES_TIMEOUT}s, shutting down anyway")
+    await prefetcher.close()
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    await sender.close()
+    await http.close()
+    shutdown_cpu_pool()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+        metrics_runner = None
+    close_stores()
+
+def create_router():
+    router = Router()
+    router.message.register(cmd_start, Command("start"))
+    router.message.register(cmd_help, Command("help"))
+    router.message.register(handle_text, F.text)
+    router.message.register(handle_other_messages)
+    router.callback_query.register(handle_navigation, CallbackKind(callbacks, WIKI_PAGE))
+    router.callback_query.register(handle_read_article, CallbackKind(callbacks, ARTICLE_READ))
+    router.callback_query.register(handle_article_navigation, CallbackKind(callbacks, ARTICLE_PAGE))
+    router.callback_query.register(handle_stale_callback)
+    router.inline_query.register(handle_inline_query)
+    return router
+
+def create_app(token=None, session=None):
+    """Собирает бота и диспетчер; токен по умолчанию берется из BOT_TOKEN."""
+    global callbacks, providers
+    token = token or BOT_TOKEN
+    if not token:
+        raise RuntimeError("BOT_TOKEN is not set")
+    callbacks = CallbackCodec(CALLBACK_SECRET or token)
+    providers = create_providers()
+    
+    bot = Bot(token=token, session=session)
+    bot.session.middleware(TelegramMetricsMiddleware())
+    
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateTimingMiddleware(SLOW_UPDATE_THRESHOLD))
+    dp.update.outer_middleware(concurrency_limit)
+    dp.include_router(create_router())
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return bot, dp
 
 async def main():
     logger.info("Бот запускается...")
+    bot, dp = create_app()
     await dp.start_polling(bot)
 
+def run_worker(index):
+    # webhook ставит только первый воркер, остальные слушают тот же порт
+    bot, dp = create_app()
+    run_webhook(dp, bot, set_webhook_on_startup=index == 0, reuse_port=True)
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if BOT_MODE == "webhook":
+        logger.info("Бот запускается в режиме webhook...")
+        if BOT_WORKERS > 1:
+            if STORE_BACKEND == 'memory':
+                logger.warning("STORE_BACKEND=memory: navigation state is not shared between workers")
+            logger.warning(
+                f"Telegram send rate and source quotas are split evenly between {BOT_WORKERS} workers; "
+                "per-chat limits are kept per worker"
+            )
+            run_processes(run_worker, BOT_WORKERS)
+        else:
+            bot, dp = create_app()
+            run_webhook(dp, bot)
+    else:
+        if BOT_WORKERS > 1:
+            logger.warning("BOT_WORKERS is ignored in polling mode: only one getUpdates consumer is allowed")
+        asyncio.run(main())
\ No newline at end of file
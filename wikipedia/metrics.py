@@ -0,0 +1,212 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labelnames, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labelnames, values)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class ScalarMetric(Metric):
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._function = function
+
+    def set_function(self, function):
+        # функция вызывается при каждом сборе метрик: число или {метки: число}
+        self._function = function
+
+    def samples(self):
+        values = dict(self._values)
+        if self._function is not None:
+            result = self._function()
+            if isinstance(result, dict):
+                values.update(result)
+            else:
+                values[()] = result
+        return [('', self.labelnames, key, value) for key, value in values.items()]
+
+
+class Counter(ScalarMetric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(ScalarMetric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        samples = []
+        bucket_labels = self.labelnames + ('le',)
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', bucket_labels, key + (_format_value(bound),), cumulative))
+            samples.append(('_sum', self.labelnames, key, total))
+            samples.append(('_count', self.labelnames, key, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+SOURCE_FETCH_SECONDS = REGISTRY.register(Histogram(
+    'bot_source_fetch_seconds', 'Upstream fetch latency per source', ('source',)
+))
+SOURCE_RESULTS = REGISTRY.register(Counter(
+    'bot_source_results_total', 'Source lookups by outcome', ('source', 'outcome')
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'bot_cache_requests_total', 'Result cache lookups per source and result', ('source', 'result')
+))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    'bot_cache_hit_ratio', 'Result cache hit ratio per source', ('source',)
+))
+CACHE_ENTRIES = REGISTRY.register(Gauge(
+    'bot_cache_entries', 'Entries in the in-memory result cache'
+))
+FORMAT_SECONDS = REGISTRY.register(Histogram(
+    'bot_format_seconds', 'Wiki markup formatting time per chunk'
+))
+SPLIT_SECONDS = REGISTRY.register(Histogram(
+    'bot_split_seconds', 'Text splitting time'
+))
+TELEGRAM_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'bot_telegram_request_seconds', 'Telegram Bot API request latency', ('method',)
+))
+TELEGRAM_ERRORS = REGISTRY.register(Counter(
+    'bot_telegram_errors_total', 'Failed Telegram Bot API requests', ('method',)
+))
+TELEGRAM_RETRIES = REGISTRY.register(Counter(
+    'bot_telegram_retries_total', 'Messages re-sent after a failed Telegram request'
+))
+UPDATE_SECONDS = REGISTRY.register(Histogram(
+    'bot_update_seconds', 'Update handling time', ('type',)
+))
+UPDATES_IN_FLIGHT = REGISTRY.register(Gauge(
+    'bot_updates_in_flight', 'Updates being handled right now'
+))
+SEND_QUEUE = REGISTRY.register(Gauge(
+    'bot_send_queue', 'Outgoing Telegram requests waiting in the send queue'
+))
+PREFETCH_JOBS = REGISTRY.register(Counter(
+    'bot_prefetch_jobs_total', 'Background prefetch jobs by kind and outcome', ('kind', 'outcome')
+))
+PREFETCH_QUEUE = REGISTRY.register(Gauge(
+    'bot_prefetch_queue', 'Background prefetch jobs waiting or running'
+))
+SEARCHES_RUNNING = REGISTRY.register(Gauge(
+    'bot_searches_running', 'Searches running or waiting for a global slot'
+))
+SEARCHES_SUPERSEDED = REGISTRY.register(Counter(
+    'bot_searches_superseded_total', 'Searches cancelled because the user sent a newer query'
+))
+STORE_ENTRIES = REGISTRY.register(Gauge(
+    'bot_store_entries', 'Entries in the article store and the local search index', ('store',)
+))
+
+
+def start_trace():
+    return _trace.set([])
+
+
+def finish_trace(token):
+    spans = _trace.get()
+    _trace.reset(token)
+    return spans or []
+
+
+def add_span(name, elapsed):
+    spans = _trace.get()
+    if spans is not None:
+        spans.append((name, elapsed))
+
+
+@contextmanager
+def timer(histogram, span=None, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if span is not None:
+            add_span(span, elapsed)
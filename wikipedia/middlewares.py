@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from metrics import (
+    TELEGRAM_ERRORS, TELEGRAM_REQUEST_SECONDS, UPDATE_SECONDS, add_span, finish_trace, start_trace
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничивает число одновременно обрабатываемых апдейтов.
+
+    Заодно помнит задачи всех принятых апдейтов, включая ждущие слота:
+    при остановке wait_idle() дает им доработать, пока сервисы еще открыты.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        self._tasks = set()
+
+    async def __call__(self, handler, event, data):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            self._tasks.discard(task)
+
+    async def wait_idle(self, timeout):
+        """Ждет завершения принятых апдейтов; возвращает число не успевших."""
+        tasks = self._tasks - {asyncio.current_task()}
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return len(pending)
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    def __init__(self, slow_threshold=0):
+        # 0 отключает журнал медленных апдейтов, гистограмма пишется всегда
+        self.slow_threshold = slow_threshold
+
+    async def __call__(self, handler, event, data):
+        token = start_trace()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            spans = finish_trace(token)
+            update_type = event.event_type
+            UPDATE_SECONDS.observe(elapsed, type=update_type)
+            if self.slow_threshold and elapsed >= self.slow_threshold:
+                breakdown = ', '.join(f"{name}={duration * 1000:.1f}ms" for name, duration in spans)
+                logger.warning(
+                    f"Slow update {event.update_id} ({update_type}): {elapsed * 1000:.1f}ms"
+                    + (f" [{breakdown}]" if breakdown else "")
+                )
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        method_name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            TELEGRAM_ERRORS.inc(method=method_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            TELEGRAM_REQUEST_SECONDS.observe(elapsed, method=method_name)
+            add_span(f"telegram.{method_name}", elapsed)
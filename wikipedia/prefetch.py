@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+
+from cache import normalize_subject
+from metrics import PREFETCH_JOBS
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', 2))
+PREFETCH_QUEUE_SIZE = int(os.getenv('PREFETCH_QUEUE_SIZE', 200))
+PREFETCH_JOB_TIMEOUT = float(os.getenv('PREFETCH_JOB_TIMEOUT', 15))
+# какая доля токенов источника остается за интерактивными запросами
+PREFETCH_RESERVE = float(os.getenv('PREFETCH_RESERVE', 0.5))
+PREFETCH_IDLE_POLL = 0.2
+
+TRENDING_MAX_SUBJECTS = 1000
+TRENDING_DECAY = 0.5
+
+
+class TrendingSubjects:
+    """Счетчик популярности тем с затуханием: старые всплески со временем забываются.
+
+    Вместе с темой запоминаются типы запросов, с которыми ее искали, чтобы
+    заранее обновлять только те источники, которые по ней опрашиваются.
+    """
+
+    def __init__(self, max_subjects=TRENDING_MAX_SUBJECTS, decay=TRENDING_DECAY):
+        self.max_subjects = max_subjects
+        self.decay = decay
+        self._scores = {}
+        self._subjects = {}
+        self._intents = {}
+
+    def __len__(self):
+        return len(self._scores)
+
+    def record(self, subject, intents=()):
+        key = normalize_subject(subject)
+        if not key:
+            return
+        self._scores[key] = self._scores.get(key, 0) + 1
+        self._subjects[key] = subject
+        self._intents[key] = self._intents.get(key, frozenset()) | frozenset(intents)
+        if len(self._scores) > self.max_subjects:
+            weakest = min(self._scores, key=self._scores.get)
+            self._forget(weakest)
+
+    def _forget(self, key):
+        del self._scores[key]
+        del self._subjects[key]
+        del self._intents[key]
+
+    def top(self, count):
+        """Самые популярные темы: [(тема, типы запросов)]."""
+        keys = sorted(self._scores, key=self._scores.get, reverse=True)[:count]
+        return [(self._subjects[key], self._intents[key]) for key in keys]
+
+    def decay_scores(self):
+        for key in list(self._scores):
+            score = self._scores[key] * self.decay
+            if score < 0.5:
+                self._forget(key)
+            else:
+                self._scores[key] = score
+
+
+class Prefetcher:
+    """Фоновые задачи с низким приоритетом.
+
+    Очередь ограничена и не хранит дублей, одновременно выполняется не больше
+    concurrency задач, и ни одна не стартует, пока бот занят (is_busy).
+    Задачи, не поместившиеся в очередь, просто отбрасываются.
+    """
+
+    def __init__(
+        self,
+        is_busy=None,
+        concurrency=PREFETCH_CONCURRENCY,
+        queue_size=PREFETCH_QUEUE_SIZE,
+        job_timeout=PREFETCH_JOB_TIMEOUT
+    ):
+        self.is_busy = is_busy or (lambda: False)
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self._queue = None
+        self._queued = set()
+        self._periodic = []
+        self._tasks = []
+
+    @property
+    def pending(self):
+        return len(self._queued)
+
+    def every(self, interval, func):
+        self._periodic.append((interval, func))
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks += [asyncio.create_task(self._repeat(interval, func)) for interval, func in self._periodic]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+
+    def schedule(self, kind, key, make_job):
+        if self._queue is None or (kind, key) in self._queued:
+            return False
+        try:
+            self._queue.put_nowait((kind, key, make_job))
+        except asyncio.QueueFull:
+            PREFETCH_JOBS.inc(kind=kind, outcome='dropped')
+            return False
+        self._queued.add((kind, key))
+        return True
+
+    async def _worker(self):
+        while True:
+            kind, key, make_job = await self._queue.get()
+            try:
+                while self.is_busy():
+                    await asyncio.sleep(PREFETCH_IDLE_POLL)
+                await asyncio.wait_for(make_job(), self.job_timeout)
+                PREFETCH_JOBS.inc(kind=kind, outcome='done')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Prefetch {kind} {key} failed: {e!r}")
+                PREFETCH_JOBS.inc(kind=kind, outcome='failed')
+            finally:
+                self._queued.discard((kind, key))
+
+    async def _repeat(self, interval, func):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                func()
+            except Exception as e:
+                logger.error(f"Periodic prefetch task failed: {e}")
@@ -0,0 +1,76 @@
+import os
+
+# суммарная стоимость источников, опрашиваемых на один запрос; 0 - без ограничения
+PROVIDER_COST_BUDGET = float(os.getenv('PROVIDER_COST_BUDGET', 0))
+
+GENERAL_INTENT = 'general'
+
+
+class Provider:
+    """Источник результатов поиска.
+
+    fetch(subject) возвращает результаты или пустое значение, ошибки
+    пробрасываются наружу. timeout - сколько поиск ждет ответа, cost -
+    относительная цена одного запроса (квота API, разбор HTML).
+    intents - вес источника для каждого типа запроса из QUERY_PATTERNS и
+    для 'general'; типы без веса источнику не интересны.
+    """
+
+    __slots__ = ('name', 'title', 'fetch', 'timeout', 'cost', 'intents')
+
+    def __init__(self, name, title, fetch, timeout, cost, intents):
+        self.name = name
+        self.title = title
+        self.fetch = fetch
+        self.timeout = timeout
+        self.cost = cost
+        self.intents = intents
+
+    def relevance(self, intents):
+        return max((self.intents.get(intent, 0) for intent in intents), default=0)
+
+
+class ProviderRegistry:
+    def __init__(self, cost_budget=PROVIDER_COST_BUDGET):
+        self.cost_budget = cost_budget
+        self._providers = {}
+
+    def __iter__(self):
+        return iter(self._providers.values())
+
+    def __len__(self):
+        return len(self._providers)
+
+    def __contains__(self, name):
+        return name in self._providers
+
+    def __getitem__(self, name):
+        return self._providers[name]
+
+    def register(self, provider):
+        if provider.name in self._providers:
+            raise ValueError(f"Provider {provider.name} is already registered")
+        self._providers[provider.name] = provider
+        return provider
+
+    def select(self, intents):
+        """Источники для запроса с такими типами, от самого подходящего к менее.
+
+        При равном весе первым идет более дешевый источник. Если задан
+        бюджет, источники берутся по порядку, пока он не исчерпан, но
+        самый подходящий опрашивается всегда.
+        """
+        ranked = sorted(
+            (provider for provider in self if provider.relevance(intents) > 0),
+            key=lambda provider: (-provider.relevance(intents), provider.cost)
+        )
+        if not self.cost_budget:
+            return ranked
+        selected = []
+        spent = 0
+        for provider in ranked:
+            if selected and spent + provider.cost > self.cost_budget:
+                continue
+            selected.append(provider)
+            spent += provider.cost
+        return selected
@@ -0,0 +1,63 @@
+import re
+
+QUERY_KEYWORDS = {
+    'definition': ('что такое', 'определение', 'что значит'),
+    'how_to': ('как', 'как сделать', 'способ', 'метод'),
+    'why': ('почему', 'зачем', 'для чего'),
+    'compare': ('сравнение', 'разница между', 'отличие'),
+    'history': ('история', 'происхождение', 'возникновение'),
+    'examples': ('примеры', 'пример', 'код')
+}
+
+QUERY_PATTERNS = {
+    pattern_type: r'(' + '|'.join(keywords) + r')\s+([^?]+)'
+    for pattern_type, keywords in QUERY_KEYWORDS.items()
+}
+
+# Все ключевые слова собраны в одну плоскую альтернацию: так re применяет
+# префиксную оптимизацию, а тип определяется по найденному слову. Тема
+# запроса тянется до ближайшего '?', поэтому на каждый отрезок между
+# вопросительными знаками у типа может быть только одно совпадение - первое.
+KEYWORD_TYPES = {
+    keyword: pattern_type
+    for pattern_type, keywords in QUERY_KEYWORDS.items()
+    for keyword in keywords
+}
+TYPE_ORDER = {pattern_type: index for index, pattern_type in enumerate(QUERY_KEYWORDS)}
+
+QUERY_RE = re.compile(
+    '(?:' + '|'.join(re.escape(keyword) for keyword in KEYWORD_TYPES) + r')(?=\s[^?])'
+)
+
+
+def analyze_query_patterns(query):
+    lowered = query.lower()
+    patterns_found = []
+    seen = set()
+
+    for match in QUERY_RE.finditer(lowered):
+        keyword = match.group()
+        pattern_type = KEYWORD_TYPES[keyword]
+        keyword_end = match.end()
+        segment_end = lowered.find('?', keyword_end)
+        if segment_end == -1:
+            segment_end = len(lowered)
+        if (pattern_type, segment_end) in seen:
+            continue
+        seen.add((pattern_type, segment_end))
+        patterns_found.append({
+            'type': pattern_type,
+            'keyword': keyword,
+            'subject': lowered[keyword_end:segment_end].strip()
+        })
+
+    if len(patterns_found) > 1:
+        patterns_found.sort(key=lambda pattern: TYPE_ORDER[pattern['type']])
+
+    if not patterns_found:
+        patterns_found.append({
+            'type': 'general',
+            'subject': query.strip()
+        })
+
+    return patterns_found
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+SOURCE_LIMITS = {
+    # неавторизованный поиск GitHub: 10 запросов в минуту
+    'github': {'rate': 10 / 60, 'capacity': 10},
+    'stackoverflow': {'rate': 0.5, 'capacity': 5},
+    'habr': {'rate': 1, 'capacity': 5},
+    'wikipedia': {'rate': 10, 'capacity': 20}
+}
+
+
+class SourceUnavailable(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_time(self):
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    async def acquire(self, max_wait):
+        while True:
+            wait = self.wait_time()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            if wait > max_wait:
+                raise SourceUnavailable(f"rate limited for {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown=60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.half_open:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.cooldown:
+            # пропускаем пробный запрос; если он потеряется, через cooldown будет следующий
+            self.opened_at = now
+            self.half_open = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.half_open or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.half_open = False
+
+
+class SourceGuard:
+    def __init__(
+        self,
+        name,
+        rate,
+        capacity,
+        failure_threshold=5,
+        cooldown=60,
+        retries=2,
+        base_delay=0.5,
+        max_wait=2
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_wait = max_wait
+
+    def has_capacity(self, reserve=0):
+        # фоновые запросы не должны съедать лимит, нужный пользователям
+        if self.breaker.state != 'closed' or self.bucket.wait_time() > 0:
+            return False
+        return self.bucket.tokens - 1 >= self.bucket.capacity * reserve
+
+    def _backoff(self, attempt):
+        return random.uniform(0, self.base_delay * 2 ** attempt)
+
+    def _apply_headers(self, headers):
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            try:
+                if int(remaining) <= 0:
+                    self.bucket.pause(max(0, float(reset) - time.time()))
+            except ValueError:
+                pass
+        retry_after = headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                self.bucket.pause(float(retry_after))
+            except ValueError:
+                pass
+
+    def _apply_payload(self, payload):
+        # StackExchange сообщает ограничения в теле ответа
+        if not isinstance(payload, dict):
+            return
+        if payload.get('backoff'):
+            self.bucket.pause(payload['backoff'])
+        if payload.get('quota_remaining') == 0:
+            self.bucket.pause(3600)
+
+    async def request(self, session, method, url, parse='json', **kwargs):
+        if not self.breaker.allow():
+            raise SourceUnavailable(f"{self.name} circuit is open")
+
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire(self.max_wait)
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    self._apply_headers(response.headers)
+                    if response.status not in TRANSIENT_STATUSES:
+                        if response.status != 200:
+                            self.breaker.record_success()
+                            return response.status, None
+                        if parse == 'json':
+                            payload = await response.json(content_type=None)
+                            self._apply_payload(payload)
+                        else:
+                            payload = await response.text()
+                        self.breaker.record_success()
+                        return response.status, payload
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+
+            logger.warning(f"{self.name} request failed (attempt {attempt + 1}): {error}")
+            if attempt < self.retries:
+                await asyncio.sleep(self._backoff(attempt))
+
+        self.breaker.record_failure()
+        raise SourceUnavailable(f"{self.name} failed after {self.retries + 1} attempts: {error}")
+
+
+def create_guards(limits=SOURCE_LIMITS, share=1):
+    # квоты источников общие на все процессы бота: каждому достается 1/share
+    guards = {}
+    for name, config in limits.items():
+        config = dict(config, rate=config['rate'] / share, capacity=max(1, config['capacity'] / share))
+        guards[name] = SourceGuard(name, **config)
+    return guards
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from stemming import stem_words
+from text_utils import unescape_markdown
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', ':memory:')
+SEARCH_INDEX_MAX_DOCUMENTS = int(os.getenv('SEARCH_INDEX_MAX_DOCUMENTS', 20000))
+SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', 3 * 24 * 3600))
+# из статьи Wikipedia индексируется только начало: в нем определение темы
+WIKI_INDEX_CHARS = 1500
+LOCAL_MAX_RESULTS = 3
+# заголовок может быть длиннее запроса на столько слов, например "Python (язык программирования)"
+TITLE_SLACK = 2
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+class LocalIndex:
+    """Полнотекстовый индекс (SQLite FTS5) по уже полученным результатам.
+
+    В FTS-таблице лежат стеммированные заголовок и текст, сами результаты -
+    в обычной таблице documents с тем же rowid. Для Wikipedia хранится только
+    pageid: страница берется из кеша или загружается одним запросом.
+    ttls - сроки жизни по источникам (как у кеша результатов): документ
+    старше срока своего источника уверенным ответом не считается.
+    """
+
+    def __init__(
+        self,
+        path=SEARCH_INDEX_PATH,
+        max_documents=SEARCH_INDEX_MAX_DOCUMENTS,
+        ttl=SEARCH_INDEX_TTL,
+        ttls=None
+    ):
+        self.path = path
+        self.max_documents = max_documents
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self._conn = sqlite3.connect(path, timeout=5)
+        if path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, source TEXT NOT NULL, "
+            "title_stems TEXT NOT NULL, payload TEXT NOT NULL, added_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_added ON documents (added_at)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+            "title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._conn.commit()
+        self.purge()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def max_age(self, source):
+        return min(self.ttl, self.ttls.get(source, self.ttl))
+
+    def _upsert(self, key, source, title, body, payload):
+        title_stems = stem_words(title)
+        row = self._conn.execute("SELECT id FROM documents WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+        cursor = self._conn.execute(
+            "INSERT INTO documents (key, source, title_stems, payload, added_at) VALUES (?, ?, ?, ?, ?)",
+            (key, source, ' '.join(title_stems), json.dumps(payload, ensure_ascii=False), time.time())
+        )
+        self._conn.execute(
+            "INSERT INTO documents_fts (rowid, title, body) VALUES (?, ?, ?)",
+            (cursor.lastrowid, ' '.join(title_stems), ' '.join(stem_words(body)))
+        )
+
+    def add(self, source, data):
+        try:
+            if source == 'wikipedia':
+                self._upsert(
+                    f"wikipedia:{data['pageid']}", source, data['title'],
+                    data['text'][:WIKI_INDEX_CHARS], {'pageid': data['pageid']}
+                )
+            else:
+                for result in data:
+                    self._upsert(
+                        f"{source}:{result['url']}", source, unescape_markdown(result['title']),
+                        unescape_markdown(result['description']), result
+                    )
+            self._evict()
+            self._conn.commit()
+        except (sqlite3.Error, KeyError) as e:
+            self._conn.rollback()
+            logger.error(f"Error indexing {source} results: {e}")
+
+    def _evict(self):
+        excess = len(self) - self.max_documents
+        if excess <= 0:
+            return
+        ids = [row[0] for row in self._conn.execute(
+            "SELECT id FROM documents ORDER BY added_at LIMIT ?", (excess,)
+        )]
+        self._delete(ids)
+
+    def _delete(self, ids):
+        for doc_id in ids:
+            self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def purge(self):
+        ids = [row[0] for row in self._conn.execute(
+            "SELECT id FROM documents WHERE added_at <= ?", (time.time() - self.ttl,)
+        )]
+        self._delete(ids)
+        self._conn.commit()
+        return len(ids)
+
+    def search(self, subject, limit=LOCAL_MAX_RESULTS):
+        """Уверенные локальные ответы по источникам: {источник: данные}.
+
+        Ответ считается уверенным, только если все значимые слова запроса
+        целиком есть в заголовке документа, а сам заголовок ненамного длиннее
+        запроса: "java" не совпадает с "javascript", а "рак" с "ракета".
+        Заголовок статьи Wikipedia к тому же должен начинаться с запроса:
+        "Python (язык программирования)" подходит к "python", а
+        "Язык программирования" к "программирование" - нет.
+        Для Wikipedia возвращается pageid лучшей страницы, для остальных -
+        список результатов.
+        """
+        stems = list(dict.fromkeys(stem_words(subject)))
+        if not stems:
+            return {}
+        # обе стороны уже стеммированы, поэтому слова сравниваются целиком, без префиксов
+        match = 'title : (' + ' '.join(f'"{stem}"' for stem in stems) + ')'
+        rows = self._conn.execute(
+            "SELECT d.source, d.title_stems, d.payload, d.added_at FROM documents_fts f JOIN documents d ON d.id = f.rowid "
+            "WHERE documents_fts MATCH ? AND d.added_at > ? "
+            f"ORDER BY bm25(documents_fts, {TITLE_WEIGHT}, {BODY_WEIGHT}) LIMIT 50",
+            (match, time.time() - self.ttl)
+        ).fetchall()
+
+        now = time.time()
+        hits = {}
+        best_extra = None
+        for source, title_stems, payload, added_at in rows:
+            if added_at <= now - self.max_age(source):
+                continue
+            title_stems = title_stems.split()
+            extra = len(title_stems) - len(stems)
+            if extra > TITLE_SLACK or not set(stems) <= set(title_stems):
+                continue
+            if source == 'wikipedia':
+                # из подходящих страниц берется самый короткий заголовок: "Python", а не "Python (значения)"
+                if best_extra is not None and extra >= best_extra:
+                    continue
+                if title_stems[:len(stems)] != stems:
+                    continue
+                best_extra = extra
+                hits[source] = json.loads(payload)['pageid']
+            else:
+                payload = json.loads(payload)
+                results = hits.setdefault(source, [])
+                if len(results) < limit:
+                    results.append(payload)
+        # неполный список хуже ответа источника: такие источники спрашиваем как обычно
+        return {
+            source: data for source, data in hits.items()
+            if source == 'wikipedia' or len(data) >= limit
+        }
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+from metrics import SEARCHES_SUPERSEDED
+
+SEARCH_PER_USER_LIMIT = int(os.getenv('SEARCH_PER_USER_LIMIT', 1))
+SEARCH_GLOBAL_LIMIT = int(os.getenv('SEARCH_GLOBAL_LIMIT', 50))
+
+
+class SearchTracker:
+    """Поиски по пользователям.
+
+    У пользователя одновременно идет не больше per_user поисков: новый запрос
+    отменяет самые старые. Всего одновременно выполняется не больше
+    global_limit поисков, остальные ждут своей очереди.
+    """
+
+    def __init__(self, per_user=SEARCH_PER_USER_LIMIT, global_limit=SEARCH_GLOBAL_LIMIT):
+        self.per_user = per_user
+        self.global_limit = global_limit
+        self._semaphore = asyncio.Semaphore(global_limit)
+        self._active = {}
+        self._superseded = set()
+
+    @property
+    def running(self):
+        return sum(len(tasks) for tasks in self._active.values())
+
+    async def _limited(self, search):
+        async with self._semaphore:
+            return await search()
+
+    async def run(self, user_id, search):
+        """Выполняет search(); возвращает False, если поиск вытеснен более новым."""
+        task = asyncio.create_task(self._limited(search))
+        tasks = self._active.setdefault(user_id, [])
+        tasks.append(task)
+        while len(tasks) > self.per_user:
+            old = tasks.pop(0)
+            if not old.done():
+                self._superseded.add(old)
+                old.cancel()
+                SEARCHES_SUPERSEDED.inc()
+
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task in self._superseded:
+                return False
+            # отменили сам обработчик: поиск тоже больше не нужен
+            task.cancel()
+            raise
+        finally:
+            self._superseded.discard(task)
+            if task in tasks:
+                tasks.remove(task)
+            if not tasks and self._active.get(user_id) is tasks:
+                del self._active[user_id]
+        return True
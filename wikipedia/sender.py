@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import TELEGRAM_RETRIES
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram: около 30 сообщений в секунду на бота и около одного в секунду на чат
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 30))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', 1))
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', 5))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 3))
+SEND_MAX_RETRY_AFTER = float(os.getenv('SEND_MAX_RETRY_AFTER', 30))
+
+PRIORITY_INTERACTIVE = 0
+# результаты поиска ранжируются дробным приоритетом внутри [PRIORITY_RESULTS, PRIORITY_STATUS)
+PRIORITY_RESULTS = 1
+PRIORITY_STATUS = 2
+
+
+class SendJob:
+    __slots__ = ('priority', 'seq', 'make_request', 'future', 'key', 'attempts', 'waiters')
+
+    def __init__(self, priority, seq, make_request, future, key):
+        self.priority = priority
+        self.seq = seq
+        self.make_request = make_request
+        self.future = future
+        self.key = key
+        self.attempts = 0
+        self.waiters = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ChatQueue:
+    __slots__ = ('bucket', 'jobs', 'keys', 'busy')
+
+    def __init__(self, rate, capacity):
+        self.bucket = TokenBucket(rate, capacity)
+        self.jobs = []
+        self.keys = {}
+        self.busy = False
+
+    def push(self, job):
+        heapq.heappush(self.jobs, job)
+        if job.key is not None:
+            self.keys[job.key] = job
+
+    def pop(self):
+        job = heapq.heappop(self.jobs)
+        if job.key is not None and self.keys.get(job.key) is job:
+            del self.keys[job.key]
+        return job
+
+    def is_idle(self):
+        return not self.jobs and not self.busy and self.bucket.wait_time() == 0 \
+            and self.bucket.tokens >= self.bucket.capacity
+
+
+class SendScheduler:
+    """Очередь исходящих запросов к Telegram.
+
+    В каждом чате одновременно выполняется не больше одного запроса, поэтому
+    порядок внутри чата определяется только приоритетом и очередностью.
+    Запросы с одинаковым ключом, ждущие в очереди, схлопываются в последний.
+    """
+
+    def __init__(
+        self,
+        global_rate=SEND_GLOBAL_RATE,
+        chat_rate=SEND_CHAT_RATE,
+        chat_burst=SEND_CHAT_BURST,
+        max_retries=SEND_MAX_RETRIES,
+        max_retry_after=SEND_MAX_RETRY_AFTER
+    ):
+        self.bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.chats = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._deliveries = set()
+
+    @property
+    def pending(self):
+        return sum(len(chat.jobs) for chat in self.chats.values())
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        for chat in self.chats.values():
+            for job in chat.jobs:
+                job.future.cancel()
+        self.chats.clear()
+
+    def submit(self, chat_id, make_request, priority=PRIORITY_INTERACTIVE, key=None):
+        """Ставит запрос в очередь без ожидания и возвращает future с его результатом.
+
+        Запросы с одним ключом, поставленные подряд, выполняются в порядке
+        постановки: ждущий в очереди заменяется последним.
+        """
+        job = self._enqueue(chat_id, make_request, priority, key)
+        # у такого запроса свой постоянный ждущий: отмена send() с тем же ключом его не снимет
+        job.waiters += 1
+        return job.future
+
+    async def send(self, chat_id, make_request, priority=PRIORITY_INTERACTIVE, key=None):
+        job = self._enqueue(chat_id, make_request, priority, key)
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # запрос, который больше никто не ждет, не отправляем
+            if job.waiters == 1:
+                job.future.cancel()
+            raise
+        finally:
+            job.waiters -= 1
+
+    def _enqueue(self, chat_id, make_request, priority, key):
+        if self._task is None:
+            raise RuntimeError("Send scheduler is not started")
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            chat = self.chats[chat_id] = ChatQueue(self.chat_rate, self.chat_burst)
+
+        job = chat.keys.get(key) if key is not None else None
+        if job is not None and not job.future.done():
+            # еще не отправленный запрос заменяется новым, ждущие получат общий результат
+            job.make_request = make_request
+        else:
+            job = SendJob(priority, next(self._seq), make_request, asyncio.get_running_loop().create_future(), key)
+            chat.push(job)
+            self._wakeup.set()
+        return job
+
+    def _next_ready(self):
+        best = None
+        delay = None
+        for chat_id, chat in list(self.chats.items()):
+            while chat.jobs and chat.jobs[0].future.done():
+                chat.pop()
+            if chat.busy or not chat.jobs:
+                if chat.is_idle():
+                    del self.chats[chat_id]
+                continue
+            wait = chat.bucket.wait_time()
+            if wait > 0:
+                delay = wait if delay is None else min(delay, wait)
+                continue
+            if best is None or chat.jobs[0] < best.jobs[0]:
+                best = chat
+        return best, delay
+
+    async def _run(self):
+        while True:
+            chat, delay = self._next_ready()
+            if chat is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = self.bucket.wait_time()
+            if wait > 0:
+                # за время ожидания может появиться запрос важнее
+                await asyncio.sleep(wait)
+                continue
+
+            self.bucket.tokens -= 1
+            chat.bucket.tokens -= 1
+            chat.busy = True
+            task = asyncio.create_task(self._deliver(chat, chat.pop()))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, chat, job):
+        try:
+            result = await job.make_request()
+        except TelegramRetryAfter as e:
+            if job.attempts < self.max_retries and e.retry_after <= self.max_retry_after:
+                job.attempts += 1
+                logger.warning(f"Flood limit hit, retrying in {e.retry_after}s (attempt {job.attempts})")
+                TELEGRAM_RETRIES.inc()
+                chat.bucket.pause(e.retry_after)
+                chat.push(job)
+            elif not job.future.done():
+                job.future.set_exception(e)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            chat.busy = False
+            self._wakeup.set()
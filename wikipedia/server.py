@@ -0,0 +1,87 @@
+import logging
+import os
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or None
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+WEBHOOK_SET_ON_STARTUP = os.getenv('WEBHOOK_SET_ON_STARTUP', '1') == '1'
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', 8080))
+WEBAPP_SHUTDOWN_TIMEOUT = float(os.getenv('WEBAPP_SHUTDOWN_TIMEOUT', 30))
+HEALTH_PATH = '/health'
+METRICS_PATH = '/metrics'
+# в режиме polling метрики отдает отдельный маленький сервер; 0 - не запускать
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
+
+async def handle_health(request: web.Request):
+    return web.json_response({'status': 'ok'})
+
+
+async def handle_metrics(request: web.Request):
+    return web.Response(
+        text=REGISTRY.render(),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
+
+
+async def start_metrics_server(port=METRICS_PORT, host=WEBAPP_HOST):
+    app = web.Application()
+    app.router.add_get(METRICS_PATH, handle_metrics)
+    app.router.add_get(HEALTH_PATH, handle_health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics are served on {host}:{port}{METRICS_PATH}")
+    return runner
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, set_webhook_on_startup=WEBHOOK_SET_ON_STARTUP):
+    async def set_webhook(bot: Bot):
+        if not set_webhook_on_startup:
+            return
+        if not WEBHOOK_BASE_URL:
+            raise RuntimeError("WEBHOOK_BASE_URL is not configured")
+        await bot.set_webhook(
+            url=WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info(f"Webhook set to {WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH}")
+
+    dp.startup.register(set_webhook)
+
+    app = web.Application()
+    app.router.add_get(HEALTH_PATH, handle_health)
+    app.router.add_get(METRICS_PATH, handle_metrics)
+    # апдейт обрабатывается в фоне, Telegram сразу получает 200
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def run_webhook(dp: Dispatcher, bot: Bot, set_webhook_on_startup=WEBHOOK_SET_ON_STARTUP, reuse_port=False):
+    app = create_webhook_app(dp, bot, set_webhook_on_startup)
+    web.run_app(
+        app,
+        host=WEBAPP_HOST,
+        port=WEBAPP_PORT,
+        reuse_port=reuse_port,
+        shutdown_timeout=WEBAPP_SHUTDOWN_TIMEOUT,
+        print=None
+    )
@@ -0,0 +1,56 @@
+import re
+
+try:
+    import snowballstemmer
+except ImportError:
+    snowballstemmer = None
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-яё]')
+
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'на', 'с', 'со', 'по', 'для', 'к', 'ко', 'о', 'об', 'от', 'из', 'у', 'за',
+    'а', 'но', 'или', 'не', 'же', 'ли', 'это', 'что', 'такое', 'как',
+    'the', 'a', 'an', 'of', 'in', 'on', 'to', 'and', 'or', 'for'
+))
+
+# Упрощенный стеммер на случай, если snowballstemmer не установлен:
+# отрезается самое длинное из типичных окончаний, основа не короче трех букв.
+RUSSIAN_ENDINGS = tuple(sorted({
+    'иями', 'ями', 'ами', 'иях', 'ием', 'ией', 'иям', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ться', 'тся', 'ешь', 'ете', 'ишь', 'ите', 'ают', 'яют', 'ует', 'уют', 'ить', 'ать', 'ять', 'еть',
+    'ый', 'ий', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям',
+    'ах', 'ях', 'ов', 'ев', 'ей', 'ия', 'ья', 'ье', 'ью', 'ию',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'
+}, key=len, reverse=True))
+MIN_STEM = 3
+
+if snowballstemmer is not None:
+    _russian = snowballstemmer.stemmer('russian')
+    _english = snowballstemmer.stemmer('english')
+else:
+    _russian = _english = None
+
+
+def _light_stem(word):
+    if CYRILLIC_RE.search(word):
+        for ending in RUSSIAN_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+                return word[:-len(ending)]
+        return word
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def stem_word(word):
+    if _russian is None:
+        return _light_stem(word)
+    if CYRILLIC_RE.search(word):
+        return _russian.stemWord(word)
+    return _english.stemWord(word)
+
+
+def stem_words(text):
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [stem_word(word) for word in words if len(word) > 1 and word not in STOP_WORDS]
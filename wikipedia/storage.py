@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKEND = os.getenv('STORE_BACKEND', 'memory')
+STORE_DB_PATH = os.getenv('STORE_DB_PATH', 'bot_state.db')
+
+ARTICLE_TTL = int(os.getenv('ARTICLE_TTL', 24 * 3600))
+ARTICLE_MAX_ENTRIES = int(os.getenv('ARTICLE_MAX_ENTRIES', 20000))
+
+
+class Article:
+    __slots__ = ('content', 'title', 'source', 'url', 'offsets')
+
+    def __init__(self, content, title, source, url, offsets=None):
+        self.content = content
+        self.title = title
+        self.source = source
+        self.url = url
+        # границы страниц (start, end) в content, считаются один раз на статью
+        self.offsets = offsets
+
+    def to_dict(self):
+        return {
+            'content': self.content,
+            'title': self.title,
+            'source': self.source,
+            'url': self.url,
+            'offsets': self.offsets
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class MemoryStore:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, record = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return record
+
+    def set(self, key, record):
+        self._data[key] = (time.monotonic() + self.ttl, record)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def close(self):
+        self._data.clear()
+
+
+class SQLiteStore:
+    def __init__(self, path, table, record_type, ttl, max_entries):
+        self.path = path
+        self.table = table
+        self.record_type = record_type
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        # WAL позволяет нескольким процессам бота читать и писать одну базу
+        self._conn = sqlite3.connect(path, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)"
+        )
+        self._conn.commit()
+        self.purge()
+
+    def __len__(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        row = self._conn.execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?",
+            (str(key), now)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(
+            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, str(key))
+        )
+        self._conn.commit()
+        return self.record_type.from_dict(json.loads(row[0]))
+
+    def set(self, key, record):
+        now = time.time()
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (str(key), json.dumps(record.to_dict(), ensure_ascii=False), now + self.ttl, now)
+        )
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+        self._conn.commit()
+
+    def purge(self):
+        cursor = self._conn.execute(
+            f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)
+        )
+        self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+def create_store(name, record_type, ttl, max_entries, backend=STORE_BACKEND, path=STORE_DB_PATH):
+    if backend == 'memory':
+        return MemoryStore(ttl, max_entries)
+    if backend == 'sqlite':
+        return SQLiteStore(path, name, record_type, ttl, max_entries)
+    raise ValueError(f"Unknown store backend: {backend}")
@@ -0,0 +1,52 @@
+import bisect
+import os
+from collections import OrderedDict
+
+from cache import normalize_subject
+
+SUGGEST_MAX_ENTRIES = int(os.getenv('SUGGEST_MAX_ENTRIES', 5000))
+SUGGEST_SCAN_LIMIT = 200
+
+
+class SuggestionIndex:
+    """Префиксный индекс недавно найденных тем.
+
+    Нормализованные темы лежат в отсортированном списке, все темы с общим
+    префиксом идут подряд и находятся двумя bisect. Самые старые темы
+    вытесняются при переполнении.
+    """
+
+    def __init__(self, max_entries=SUGGEST_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._keys = []
+        self._subjects = OrderedDict()
+
+    def __len__(self):
+        return len(self._subjects)
+
+    def add(self, subject):
+        key = normalize_subject(subject)
+        if not key:
+            return
+        if key in self._subjects:
+            self._subjects.move_to_end(key)
+            return
+        self._subjects[key] = subject
+        bisect.insort(self._keys, key)
+        while len(self._subjects) > self.max_entries:
+            old_key, _ = self._subjects.popitem(last=False)
+            del self._keys[bisect.bisect_left(self._keys, old_key)]
+
+    def lookup(self, prefix, limit=5):
+        prefix = normalize_subject(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._keys, prefix)
+        matches = []
+        for key in self._keys[start:start + SUGGEST_SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        # точное совпадение первым, дальше более короткие (близкие к запросу) темы
+        matches.sort(key=len)
+        return [self._subjects[key] for key in matches[:limit]]
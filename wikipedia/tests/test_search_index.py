@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_index import LocalIndex
+
+
+def wiki_page(pageid, title):
+    return {'pageid': pageid, 'title': title, 'text': f"{title} - статья для проверки индекса."}
+
+
+def habr_results(*titles):
+    return [
+        {'title': title, 'description': f"Описание: {title}", 'url': f"https://habr.com/ru/articles/{number}/"}
+        for number, title in enumerate(titles, 1)
+    ]
+
+
+@pytest.fixture
+def index():
+    index = LocalIndex(':memory:')
+    for pageid, title in enumerate((
+        'Python', 'Python (значения)', 'JavaScript', 'Ракета-носитель', 'Русский язык', 'Язык программирования'
+    ), 1):
+        index.add('wikipedia', wiki_page(pageid, title))
+    index.add('habr', habr_results('Python урок 1', 'Python урок 2', 'Python урок 3'))
+    yield index
+    index.close()
+
+
+def test_exact_title_is_confident(index):
+    hits = index.search('python')
+    # из подходящих страниц берется самая короткая: "Python", а не "Python (значения)"
+    assert hits['wikipedia'] == 1
+    assert [result['title'] for result in hits['habr']] == ['Python урок 1', 'Python урок 2', 'Python урок 3']
+
+
+@pytest.mark.parametrize('query', ['java', 'рак', 'ру', 'py', 'программирование'])
+def test_prefix_or_partial_match_is_not_confident(index, query):
+    assert index.search(query) == {}
+
+
+def test_documents_older_than_source_ttl_are_not_confident():
+    index = LocalIndex(':memory:', ttls={'habr': 1800})
+    index.add('wikipedia', wiki_page(1, 'Python'))
+    index.add('habr', habr_results('Python урок 1', 'Python урок 2', 'Python урок 3'))
+    # час назад: для Habr (30 минут) уже устарело, для Wikipedia (без своего срока) - нет
+    index._conn.execute("UPDATE documents SET added_at = added_at - 3600")
+    assert index.search('python') == {'wikipedia': 1}
+    index.close()
@@ -0,0 +1,16 @@
+import re
+
+MARKDOWN_ESCAPE_RE = re.compile(r'([_*\[\]()~`>#+\-=|{}.!])')
+MARKDOWN_UNESCAPE_RE = re.compile(r'\\([_*\[\]()~`>#+\-=|{}.!])')
+
+
+def escape_markdown(text):
+    if not text:
+        return ""
+    return MARKDOWN_ESCAPE_RE.sub(r'\\\1', text)
+
+
+def unescape_markdown(text):
+    if not text:
+        return ""
+    return MARKDOWN_UNESCAPE_RE.sub(r'\1', text)
@@ -0,0 +1,82 @@
+import re
+
+# Один проход по тексту: на каждой позиции ищется ближайшая разметка,
+# текст между совпадениями копируется как есть.
+WIKI_TOKEN_RE = re.compile(r"""
+      (?P<heading>={2,6})(?P<heading_text>.+?)(?P=heading)
+    | '''(?P<bold>.*?)'''
+    | ''(?P<italic>.*?)''
+    | \[\[(?:[^|\]]+\|)?(?P<link>[^\]]+)\]\]
+    | \{\{.*?\}\}
+    | <.*?>
+    | (?P<bullet>\n\*+)
+""", re.VERBOSE)
+
+LEADING_BULLET_RE = re.compile(r'\*+')
+SPACES_RE = re.compile(r' {2,}')
+BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+
+def _format_markup(text, pos=0, endpos=None):
+    if endpos is None:
+        endpos = len(text)
+    parts = []
+    last = pos
+
+    if pos == 0 or text[pos - 1] == '\n':
+        leading = LEADING_BULLET_RE.match(text, pos, endpos)
+        if leading:
+            parts.append('•')
+            last = leading.end()
+
+    for match in WIKI_TOKEN_RE.finditer(text, last, endpos):
+        parts.append(text[last:match.start()])
+        last = match.end()
+
+        kind = match.lastgroup
+        if kind == 'heading_text':
+            parts.append('**' + _format_markup(match.group('heading_text')) + '**')
+        elif kind == 'bold':
+            parts.append('**' + _format_markup(match.group('bold')) + '**')
+        elif kind == 'italic':
+            parts.append('*' + _format_markup(match.group('italic')) + '*')
+        elif kind == 'link':
+            parts.append(_format_markup(match.group('link')))
+        elif kind == 'bullet':
+            parts.append('\n•')
+        # шаблоны и теги просто выбрасываются
+
+    parts.append(text[last:endpos])
+    return ''.join(parts)
+
+
+def _normalize_spaces(text):
+    text = SPACES_RE.sub(' ', text)
+    return BLANK_LINES_RE.sub('\n\n', text)
+
+
+def format_wiki_chunk(text, start, end):
+    return _normalize_spaces(_format_markup(text, start, end)).strip()
+
+
+def split_offsets(text, max_length=4000):
+    # Разметка при форматировании только сокращает текст, поэтому страница,
+    # нарезанная по исходному тексту, после форматирования не превысит max_length.
+    offsets = []
+    length = len(text)
+    start = 0
+    while start < length:
+        if length - start <= max_length:
+            offsets.append((start, length))
+            break
+        limit = start + max_length
+        end = text.rfind('\n', start + 1, limit)
+        if end == -1:
+            end = text.rfind(' ', start + 1, limit)
+        if end == -1:
+            end = limit
+        offsets.append((start, end))
+        start = end
+        while start < length and text[start].isspace():
+            start += 1
+    return offsets
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 1))
+CPU_WORKERS = int(os.getenv('CPU_WORKERS', 0))
+
+_cpu_pool = None
+
+
+def start_cpu_pool(workers=CPU_WORKERS):
+    global _cpu_pool
+    if workers <= 0 or _cpu_pool is not None:
+        return
+    # spawn, как и у воркеров бота: форк процесса с запущенным event loop,
+    # потоками резолвера aiohttp и открытыми SQLite-соединениями небезопасен
+    _cpu_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    logger.info(f"CPU pool started with {workers} processes")
+
+
+def shutdown_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        return
+    _cpu_pool.shutdown(wait=False, cancel_futures=True)
+    _cpu_pool = None
+
+
+async def run_cpu(func, *args):
+    # без пула функция выполняется прямо в event loop, как раньше
+    if _cpu_pool is None:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_pool, func, *args)
+
+
+def run_processes(target, count):
+    # spawn: каждый воркер заново импортирует модули и открывает свои соединения
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=target, args=(index,), name=f"bot-worker-{index}")
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {count} bot worker processes")
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # SIGINT уже получили все процессы группы, ждем их корректного завершения
+        for process in processes:
+            process.join()